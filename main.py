@@ -22,7 +22,6 @@ def check_environment():
     required_dirs = [
         'data/raw',
         'data/images/images_electronics',
-        'data/images/user_uploads',
         'database_chroma/text',
         'database_chroma/images'
     ]
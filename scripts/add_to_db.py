@@ -2,6 +2,7 @@ import os
 import sys
 import time
 from pathlib import Path
+import argparse
 
 # Add the src directory to Python path
 src_path = Path(__file__).parent.parent / "src"
@@ -11,6 +12,14 @@ from data_processor import DataProcessor
 from db_manager import DatabaseManager
 
 def main():
+    parser = argparse.ArgumentParser(description='Add products to the vector database')
+    parser.add_argument('--dedup_images', action='store_true', help='embed duplicate product images only once')
+    parser.add_argument('--near_duplicate_distance', type=int, default=None,
+                        help='with --dedup_images, also group same-coloured images whose perceptual hashes differ '
+                             'from the group representative in at most this many bits (off by default)')
+    parser.add_argument('--duplicate_report', type=str, default=None, help='path to write duplicate image clusters (JSON)')
+    args = parser.parse_args()
+
     # Initialize paths
     data_file = "data/raw/electronics_product.csv"
     image_folder = "data/images/images_electronics"
@@ -39,7 +48,10 @@ def main():
         db_manager.add_products_to_db(
             products_df=products_df,
             image_folder_path=image_folder,
-            batch_size=3500
+            batch_size=3500,
+            dedup_images=args.dedup_images,
+            duplicate_report_path=args.duplicate_report,
+            near_duplicate_distance=args.near_duplicate_distance
         )
         print(f"Step 3: Add products to DB - {time.time() - start_time:.2f} seconds")
     except Exception as e:
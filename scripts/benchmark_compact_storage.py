@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+from pathlib import Path
+import argparse
+import numpy as np
+
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.vector_store import MemmapVectorStore
+
+def first_pass_nbytes(store):
+    """Bytes the first-pass scan needs resident in RAM."""
+    if store.compact == "float16":
+        return store.compact_index.nbytes
+    if store.compact == "pq":
+        codebooks, codes = store.compact_index
+        return codebooks.nbytes + codes.nbytes
+    return store.embeddings.nbytes
+
+def make_queries(store, num_queries, noise, seed=0):
+    """Sample stored vectors and perturb them so queries are near, not on, the catalog."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(store.count(), size=min(num_queries, store.count()), replace=False)
+    queries = np.asarray(store.embeddings[np.sort(rows)], dtype=np.float32)
+    scale = noise * np.linalg.norm(queries, axis=1, keepdims=True) / np.sqrt(queries.shape[1])
+    return queries + rng.normal(size=queries.shape).astype(np.float32) * scale
+
+def run_queries(store, queries, k):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        rows, _ = store.search(query[None, :], n_results=k)
+        latencies.append(time.perf_counter() - start)
+        results.append(set(rows[0].tolist()))
+    return np.array(latencies) * 1000, results
+
+def main():
+    parser = argparse.ArgumentParser(description='Report memory saved and recall lost by compact vector storage')
+    parser.add_argument('--snapshot_dir', type=str, default='data/snapshots/latest', help='snapshot directory')
+    parser.add_argument('--num_queries', type=int, default=200, help='queries per collection')
+    parser.add_argument('--k', type=int, default=5, help='neighbours per query')
+    parser.add_argument('--noise', type=float, default=0.1, help='relative noise added to sampled query vectors')
+    parser.add_argument('--rescore_factor', type=int, default=10, help='shortlist size as a multiple of k')
+    args = parser.parse_args()
+
+    for name in ("text", "images"):
+        snapshot_dir = os.path.join(args.snapshot_dir, name)
+        exact_store = MemmapVectorStore.from_snapshot(snapshot_dir, None)
+        queries = make_queries(exact_store, args.num_queries, args.noise)
+        exact_ms, exact = run_queries(exact_store, queries, args.k)
+        full_bytes = first_pass_nbytes(exact_store)
+
+        print(f"\n------ {name}: {exact_store.count()} items x {exact_store.embeddings.shape[1]} dims ------")
+        print(f"{'float32':>8}: {full_bytes / 2**20:8.2f} MiB | recall@{args.k} 1.000 | "
+              f"p50 {np.percentile(exact_ms, 50):.2f} ms | p95 {np.percentile(exact_ms, 95):.2f} ms")
+        for compact in ("float16", "pq"):
+            store = MemmapVectorStore.from_snapshot(snapshot_dir, None, compact=compact,
+                                                    rescore_factor=args.rescore_factor)
+            latencies, results = run_queries(store, queries, args.k)
+            recall = np.mean([len(found & truth) / len(truth) for found, truth in zip(results, exact)])
+            nbytes = first_pass_nbytes(store)
+            print(f"{compact:>8}: {nbytes / 2**20:8.2f} MiB ({full_bytes / nbytes:.1f}x smaller) | "
+                  f"recall@{args.k} {recall:.3f} | "
+                  f"p50 {np.percentile(latencies, 50):.2f} ms | p95 {np.percentile(latencies, 95):.2f} ms")
+
+if __name__ == "__main__":
+    main()
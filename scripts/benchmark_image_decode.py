@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+from pathlib import Path
+import argparse
+import numpy as np
+from PIL import Image
+
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from chromadb.utils.data_loaders import ImageLoader
+from src.image_loader import CLIP_IMAGE_SIZE, DraftImageLoader, load_clip_image, to_rgb
+
+def load_full_resolution(uri, size=CLIP_IMAGE_SIZE):
+    """Baseline: full-resolution decode followed by the same resize and center crop."""
+    with Image.open(uri) as img:
+        img = to_rgb(img)
+        scale = size / min(img.size)
+        resized = (max(size, round(img.size[0] * scale)), max(size, round(img.size[1] * scale)))
+        img = img.resize(resized, Image.Resampling.BICUBIC)
+        left, top = (resized[0] - size) // 2, (resized[1] - size) // 2
+        return np.asarray(img.crop((left, top, left + size, top + size)))
+
+def throughput(func, items):
+    start = time.perf_counter()
+    results = func(items)
+    return len(items) / (time.perf_counter() - start), results
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare full-resolution and reduced-resolution JPEG decode throughput')
+    parser.add_argument('--image_folder', type=str, default='data/images/images_electronics', help='folder of product images')
+    parser.add_argument('--limit', type=int, default=500, help='number of images to decode')
+    parser.add_argument('--size', type=int, default=CLIP_IMAGE_SIZE, help='model input size')
+    args = parser.parse_args()
+
+    uris = sorted(os.path.join(args.image_folder, name) for name in os.listdir(args.image_folder)
+                  if name.lower().endswith(('.jpg', '.jpeg')))[:args.limit]
+    if not uris:
+        print(f"No JPEG images found in {args.image_folder}")
+        return
+    print(f"Decoding {len(uris)} images from {args.image_folder}")
+
+    # Warm the page cache so both paths read from memory
+    for uri in uris:
+        with open(uri, 'rb') as f:
+            f.read()
+
+    full_rate, full = throughput(lambda items: [load_full_resolution(uri, args.size) for uri in items], uris)
+    draft_rate, draft = throughput(lambda items: [load_clip_image(uri, args.size) for uri in items], uris)
+    chroma_rate, _ = throughput(ImageLoader(), uris)
+    loader_rate, _ = throughput(DraftImageLoader(size=args.size), uris)
+
+    diff = np.mean([np.abs(a.astype(np.int16) - b.astype(np.int16)).mean() for a, b in zip(full, draft)])
+    print(f"{'path':<40} {'images/s':>10}")
+    print(f"{'full decode + resize (1 thread)':<40} {full_rate:>10.1f}")
+    print(f"{'draft decode + resize (1 thread)':<40} {draft_rate:>10.1f}")
+    print(f"{'chroma ImageLoader (full arrays)':<40} {chroma_rate:>10.1f}")
+    print(f"{'DraftImageLoader':<40} {loader_rate:>10.1f}")
+    print(f"Speedup (1 thread): {draft_rate / full_rate:.2f}x")
+    print(f"Mean absolute pixel difference vs full decode: {diff:.2f} / 255")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+from pathlib import Path
+import argparse
+import numpy as np
+
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.db_manager import DatabaseManager
+from src.vector_store import MemmapVectorStore
+
+def make_queries(store, num_queries, noise, seed=0):
+    """Sample stored vectors and perturb them so queries are near, not on, the catalog."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(store.count(), size=min(num_queries, store.count()), replace=False)
+    queries = np.asarray(store.embeddings[np.sort(rows)], dtype=np.float32)
+    scale = noise * np.linalg.norm(queries, axis=1, keepdims=True) / np.sqrt(queries.shape[1])
+    return queries + rng.normal(size=queries.shape).astype(np.float32) * scale
+
+def time_queries(store, queries, k):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = store.query(query_embeddings=[query.tolist()], n_results=k, include=['distances'])
+        latencies.append(time.perf_counter() - start)
+        results.append(result['ids'][0])
+    return np.array(latencies) * 1000, results
+
+def recall_at_k(results, ground_truth):
+    hits = [len(set(found) & set(truth)) / max(len(truth), 1) for found, truth in zip(results, ground_truth)]
+    return float(np.mean(hits))
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare Chroma and memmap vector store recall and latency')
+    parser.add_argument('--snapshot_dir', type=str, default='data/snapshots/latest', help='snapshot of the Chroma collections')
+    parser.add_argument('--num_queries', type=int, default=200, help='queries per collection')
+    parser.add_argument('--k', type=int, default=5, help='neighbours per query')
+    parser.add_argument('--noise', type=float, default=0.1, help='relative noise added to sampled query vectors')
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(vector_backend="chroma")
+    if not os.path.exists(os.path.join(args.snapshot_dir, "text", "manifest.json")):
+        db_manager.export_snapshot(args.snapshot_dir)
+
+    for name, chroma_store in (("text", db_manager.text_collection), ("images", db_manager.image_collection)):
+        memmap_store = MemmapVectorStore.from_snapshot(
+            os.path.join(args.snapshot_dir, name), chroma_store.embedding_function
+        )
+        queries = make_queries(memmap_store, args.num_queries, args.noise)
+
+        # Brute force is exact, so its answers are the ground truth for recall
+        memmap_ms, exact = time_queries(memmap_store, queries, args.k)
+        chroma_ms, approx = time_queries(chroma_store, queries, args.k)
+
+        print(f"\n------ {name}: {memmap_store.count()} items, {len(queries)} queries, k={args.k} ------")
+        for backend, latencies, results in (("chroma", chroma_ms, approx), ("memmap", memmap_ms, exact)):
+            print(f"{backend:>7}: recall@{args.k} {recall_at_k(results, exact):.3f} | "
+                  f"p50 {np.percentile(latencies, 50):.2f} ms | p95 {np.percentile(latencies, 95):.2f} ms | "
+                  f"p99 {np.percentile(latencies, 99):.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import resource
+import tempfile
+import threading
+import traceback
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from langchain_core.runnables import RunnableLambda
+from src.chatbot import ELectronicsChatbot
+from src.db_manager import DatabaseManager
+from src.vector_store import MemmapVectorStore
+from ui.app import process_query, process_image_search
+
+SUB_CATEGORIES = ["headphones", "laptops", "cameras", "smartphones", "speakers", "smartwatches"]
+COLOURS = ["black", "white", "red", "blue", "silver", "green"]
+TEXT_QUERIES = [
+    "What are the best wireless {c}?",
+    "Find me good {c} under $500",
+    "What's the highest rated {c}?",
+    "Show me {colour} {c} with good reviews",
+]
+MULTIMODAL_QUERIES = ["Find this in {colour}", "Is there a cheaper version of this?", "Show me similar {c}"]
+
+
+class FakeEmbeddingFunction:
+    """
+    Deterministic stand-in for MiniLM/CLIP: hashed bag-of-words for text and a
+    fixed random projection of an 8x8 thumbnail for images.
+    """
+
+    def __init__(self, dim, seed=0):
+        self.dim = dim
+        self.projection = np.random.default_rng(seed).normal(size=(8 * 8 * 3, dim)).astype(np.float32)
+
+    def _embed_text(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in str(text).lower().split():
+            digest = int(hashlib.md5(token.encode()).hexdigest(), 16)
+            vector[digest % self.dim] += 1.0 if (digest >> 64) & 1 else -1.0
+        return vector
+
+    def _embed_image(self, image):
+        thumbnail = Image.fromarray(np.asarray(image, dtype=np.uint8)).convert('RGB').resize((8, 8))
+        return (np.asarray(thumbnail, dtype=np.float32).reshape(-1) / 255.0 - 0.5) @ self.projection
+
+    def __call__(self, inputs):
+        vectors = []
+        for item in inputs:
+            vector = self._embed_text(item) if isinstance(item, str) else self._embed_image(item)
+            vectors.append(vector / max(np.linalg.norm(vector), 1e-12))
+        return vectors
+
+
+def fake_llm(latency_ms, jitter_ms, stall_rate=0.0, stall_ms=0.0):
+    """Runnable that waits like a remote LLM call (stalling for stall_ms with probability stall_rate)."""
+    def answer(prompt_value):
+        stall = stall_ms if random.random() < stall_rate else 0.0
+        time.sleep(max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000 + stall / 1000)
+        return "Main answer: product_id 1. Alternative: product_id 2."
+    return RunnableLambda(answer)
+
+
+def build_synthetic_catalog(num_products, image_dir, seed=0):
+    """Write simple product images and return (ids, documents, metadatas, uris)."""
+    rng = random.Random(seed)
+    ids, documents, metadatas, uris = [], [], [], []
+    for i in range(num_products):
+        product_id = str(i)
+        sub_category = rng.choice(SUB_CATEGORIES)
+        colour = rng.choice(COLOURS)
+        uri = os.path.join(image_dir, f"{product_id}.jpg")
+        if not os.path.exists(uri):
+            image = Image.new('RGB', (320, 320), (255, 255, 255))
+            draw = ImageDraw.Draw(image)
+            box = [rng.randint(10, 120), rng.randint(10, 120), rng.randint(180, 310), rng.randint(180, 310)]
+            draw.ellipse(box, fill=colour) if rng.random() < 0.5 else draw.rectangle(box, fill=colour)
+            image.save(uri, quality=85)
+        name = f"{colour.title()} {sub_category[:-1].title()} {i}"
+        price = f"{rng.randint(20, 2000)}"
+        ratings = f"{rng.uniform(2.5, 5.0):.1f}"
+        ids.append(product_id)
+        uris.append(uri)
+        documents.append(f"Product: {name}\nCategory: {sub_category}\nRating: {ratings}\nPrice: ${price}")
+        metadatas.append({"product_id": product_id, "name": name, "sub_category": sub_category,
+                          "ratings": ratings, "discount_price": price, "uri": uri})
+    return ids, documents, metadatas, uris
+
+
+def synthetic_stores(num_products, image_dir):
+    """In-process text and image stores over a synthetic catalog with fake embeddings."""
+    ids, documents, metadatas, uris = build_synthetic_catalog(num_products, image_dir)
+    text_ef, image_ef = FakeEmbeddingFunction(384, seed=1), FakeEmbeddingFunction(512, seed=2)
+    text_embeddings = np.asarray(text_ef(documents), dtype=np.float32)
+    image_embeddings = np.asarray(image_ef([np.asarray(Image.open(uri)) for uri in uris]), dtype=np.float32)
+    text_store = MemmapVectorStore("electronics_text_dataset", text_embeddings, ids, text_ef,
+                                   metadatas=metadatas, documents=documents)
+    image_store = MemmapVectorStore("electronics_image_dataset", image_embeddings, ids, image_ef,
+                                    metadatas=metadatas, uris=uris)
+    return text_store, image_store, uris
+
+
+def load_workload(args, image_uris):
+    """Requests as dicts with 'type' (text/image/multimodal), 'message' and 'image' (path)."""
+    if args.query_log:
+        with open(args.query_log) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    rng = random.Random(args.seed)
+    weights = dict(item.split('=') for item in args.mix.split(','))
+    kinds, probabilities = list(weights), [float(weight) for weight in weights.values()]
+    workload = []
+    for _ in range(args.requests):
+        kind = rng.choices(kinds, probabilities)[0]
+        fill = {"c": rng.choice(SUB_CATEGORIES), "colour": rng.choice(COLOURS)}
+        request = {"type": kind}
+        if kind in ("text", "multimodal"):
+            request["message"] = rng.choice(TEXT_QUERIES if kind == "text" else MULTIMODAL_QUERIES).format(**fill)
+        if kind in ("image", "multimodal"):
+            request["image"] = rng.choice(image_uris)
+        workload.append(request)
+    return workload
+
+
+def run_request(chatbot_instance, request):
+    """Drive one request through the same handlers the Gradio UI uses."""
+    image = Image.open(request["image"]) if request.get("image") else None
+    if request["type"] == "image":
+        return process_image_search(image, [], chatbot_instance=chatbot_instance)
+    return process_query(request.get("message", ""), [], image, chatbot_instance=chatbot_instance)
+
+
+class ProcessSampler(threading.Thread):
+    """Samples CPU time and RSS of this process (and any extra pids) from /proc."""
+
+    def __init__(self, pids, interval=0.5):
+        super().__init__(daemon=True)
+        self.pids = [os.getpid()] + list(pids)
+        self.interval = interval
+        self.samples = {pid: [] for pid in self.pids}
+        self._done = threading.Event()
+        self._ticks = os.sysconf('SC_CLK_TCK')
+        self._page_size = os.sysconf('SC_PAGE_SIZE')
+
+    def _read(self, pid):
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / self._ticks
+        with open(f"/proc/{pid}/statm") as f:
+            rss_bytes = int(f.read().split()[1]) * self._page_size
+        return time.monotonic(), cpu_seconds, rss_bytes
+
+    def run(self):
+        while not self._done.is_set():
+            for pid in self.pids:
+                try:
+                    self.samples[pid].append(self._read(pid))
+                except (OSError, IndexError, ValueError):
+                    pass
+            self._done.wait(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        for pid in self.pids:
+            try:
+                self.samples[pid].append(self._read(pid))
+            except (OSError, IndexError, ValueError):
+                pass
+
+    def summary(self):
+        summary = {}
+        for pid, samples in self.samples.items():
+            if len(samples) < 2:
+                continue
+            (t0, cpu0, _), (t1, cpu1, _) = samples[0], samples[-1]
+            summary[pid] = {
+                "cpu_percent": 100.0 * (cpu1 - cpu0) / max(t1 - t0, 1e-9),
+                "rss_mib_peak": max(rss for _, _, rss in samples) / 2**20,
+                "rss_mib_end": samples[-1][2] / 2**20,
+            }
+        return summary
+
+
+def run_load(chatbot_instance, workload, concurrency, rate=None, seed=0):
+    """
+    Run the workload closed-loop (concurrency workers back to back) or open-loop
+    (Poisson arrivals at rate per second). Open-loop latency is measured from
+    the scheduled arrival, so time spent queueing for a worker is included.
+    """
+    rng = random.Random(seed)
+    results = [None] * len(workload)
+
+    def execute(i, scheduled):
+        try:
+            run_request(chatbot_instance, workload[i])
+            results[i] = (workload[i]["type"], time.perf_counter() - scheduled, None)
+        except Exception as e:
+            results[i] = (workload[i]["type"], time.perf_counter() - scheduled, f"{type(e).__name__}: {e}")
+            traceback.print_exc(limit=1)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if rate is None:
+            for i in range(len(workload)):
+                executor.submit(lambda i=i: execute(i, time.perf_counter()))
+        else:
+            next_arrival = start
+            for i in range(len(workload)):
+                next_arrival += rng.expovariate(rate)
+                time.sleep(max(0.0, next_arrival - time.perf_counter()))
+                executor.submit(execute, i, next_arrival)
+    return results, time.perf_counter() - start
+
+
+def report(results, elapsed, process_summary):
+    latencies = np.array([latency for _, latency, error in results if error is None]) * 1000
+    errors = [error for _, _, error in results if error is not None]
+    summary = {
+        "requests": len(results),
+        "elapsed_s": elapsed,
+        "throughput_rps": (len(results) - len(errors)) / elapsed,
+        "error_rate": len(errors) / max(len(results), 1),
+        "latency_ms": {f"p{p}": float(np.percentile(latencies, p)) for p in (50, 90, 95, 99)} if len(latencies) else {},
+        "by_type": {},
+        "errors": sorted(set(errors))[:10],
+        "processes": process_summary,
+        "max_rss_mib_self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    for kind in sorted({kind for kind, _, _ in results}):
+        kind_latencies = np.array([latency for k, latency, error in results if k == kind and error is None]) * 1000
+        if len(kind_latencies):
+            summary["by_type"][kind] = {"count": len(kind_latencies),
+                                        "p50_ms": float(np.percentile(kind_latencies, 50)),
+                                        "p99_ms": float(np.percentile(kind_latencies, 99))}
+
+    print(f"\nRequests: {summary['requests']} in {elapsed:.2f}s | "
+          f"throughput {summary['throughput_rps']:.2f} req/s | error rate {summary['error_rate']:.2%}")
+    print("Latency: " + " | ".join(f"{p} {v:.1f} ms" for p, v in summary["latency_ms"].items()))
+    for kind, stats in summary["by_type"].items():
+        print(f"  {kind:>10}: n={stats['count']} p50 {stats['p50_ms']:.1f} ms p99 {stats['p99_ms']:.1f} ms")
+    for pid, stats in process_summary.items():
+        print(f"  pid {pid}: CPU {stats['cpu_percent']:.0f}% | RSS peak {stats['rss_mib_peak']:.0f} MiB")
+    for error in summary["errors"]:
+        print(f"  error: {error}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the chat and image-search handlers')
+    parser.add_argument('--catalog', choices=['synthetic', 'database'], default='synthetic',
+                        help='synthetic in-process catalog with fake embeddings, or the configured DatabaseManager')
+    parser.add_argument('--num_products', type=int, default=2000, help='synthetic catalog size')
+    parser.add_argument('--requests', type=int, default=200, help='number of synthetic requests')
+    parser.add_argument('--mix', type=str, default='text=0.7,image=0.2,multimodal=0.1', help='synthetic request mix')
+    parser.add_argument('--query_log', type=str, default=None, help='JSONL of {"type", "message", "image"} to replay')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent workers')
+    parser.add_argument('--rate', type=float, default=None, help='open-loop arrival rate (req/s); closed loop if unset')
+    parser.add_argument('--llm_latency_ms', type=float, default=800, help='mean fake LLM latency')
+    parser.add_argument('--llm_jitter_ms', type=float, default=200, help='fake LLM latency standard deviation')
+    parser.add_argument('--llm_stall_rate', type=float, default=0.0, help='fraction of fake LLM calls that stall')
+    parser.add_argument('--llm_stall_ms', type=float, default=10000, help='extra latency of a stalled call')
+    parser.add_argument('--latency_budget', type=float, default=None,
+                        help='per-request budget in seconds; slower answers degrade to retrieval-only')
+    parser.add_argument('--hedge_after', type=float, default=None, help='start a second LLM call after this many seconds')
+    parser.add_argument('--embed_batch_size', type=int, default=0,
+                        help='micro-batch query embeddings up to this size (0 embeds each query separately)')
+    parser.add_argument('--embed_wait_ms', type=float, default=2, help='micro-batching wait time')
+    parser.add_argument('--pids', type=int, nargs='*', default=[], help='extra processes to sample (e.g. a Chroma server)')
+    parser.add_argument('--output', type=str, default=None, help='write the summary as JSON')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    image_dir = os.path.join(tempfile.gettempdir(), "load_test_catalog")
+    os.makedirs(image_dir, exist_ok=True)
+    text_store, image_store, image_uris = synthetic_stores(args.num_products, image_dir)
+    if args.catalog == "database":
+        db_manager = DatabaseManager()
+        text_store, image_store = db_manager.text_collection, db_manager.image_collection
+
+    chatbot_instance = ELectronicsChatbot(text_store, image_store,
+                                          llm=fake_llm(args.llm_latency_ms, args.llm_jitter_ms,
+                                                       args.llm_stall_rate, args.llm_stall_ms),
+                                          latency_budget=args.latency_budget,
+                                          hedge_after=args.hedge_after,
+                                          embed_batch_size=args.embed_batch_size,
+                                          embed_wait_ms=args.embed_wait_ms)
+    workload = load_workload(args, image_uris)
+    print(f"Running {len(workload)} requests, concurrency {args.concurrency}, "
+          f"{'closed loop' if args.rate is None else f'{args.rate} req/s open loop'}")
+
+    sampler = ProcessSampler(args.pids)
+    sampler.start()
+    results, elapsed = run_load(chatbot_instance, workload, args.concurrency, args.rate, args.seed)
+    sampler.stop()
+
+    summary = report(results, elapsed, sampler.summary())
+    if args.latency_budget is not None:
+        summary["deadline"] = dict(chatbot_instance.deadline_stats)
+        print("Deadline: " + " | ".join(f"{event} {count}" for event, count in sorted(summary["deadline"].items())))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+if __name__ == "__main__":
+    main()
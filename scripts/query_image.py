@@ -3,15 +3,14 @@ import sys
 import time
 from pathlib import Path
 import argparse
-import numpy as np
-from PIL import Image
 
-# Add the src directory to Python path
-src_path = Path(__file__).parent.parent / "src"
-sys.path.append(str(src_path))
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
 
-from db_manager import DatabaseManager
-from chatbot import ELectronicsChatbot
+from src.db_manager import DatabaseManager
+from src.chatbot import ELectronicsChatbot
+from src.image_loader import load_clip_image
 
 def main():
     parser = argparse.ArgumentParser(description='Image-based chatbot query')
@@ -26,8 +25,8 @@ def main():
     
     chatbot = ELectronicsChatbot(db_manager.text_collection, db_manager.image_collection)
     
-    # Load and process image
-    image_npy = np.array(Image.open(args.image_path))
+    # Load the image at reduced resolution, ready for CLIP
+    image_npy = load_clip_image(args.image_path)
     response = chatbot.query_image(image_npy)
     
     print("\nAnswer:")
@@ -0,0 +1,31 @@
+import sys
+import time
+from pathlib import Path
+import argparse
+
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.db_manager import DatabaseManager
+
+def main():
+    parser = argparse.ArgumentParser(description='Export or import a vector database snapshot')
+    parser.add_argument('action', choices=['export', 'import'], help='export the local database or import a snapshot')
+    parser.add_argument('--snapshot_dir', type=str, default='data/snapshots/latest', help='snapshot directory')
+    parser.add_argument('--batch_size', type=int, default=5000, help='records per batch')
+    parser.add_argument('--no_verify', action='store_true', help='skip checksum verification on import')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    db_manager = DatabaseManager()
+
+    if args.action == 'export':
+        db_manager.export_snapshot(args.snapshot_dir, page_size=args.batch_size)
+    else:
+        db_manager.import_snapshot(args.snapshot_dir, batch_size=args.batch_size, verify=not args.no_verify)
+
+    print(f"Snapshot {args.action} - {time.time() - start_time:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
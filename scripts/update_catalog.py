@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+from pathlib import Path
+import argparse
+import pandas as pd
+
+# Add the project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.catalog import CATALOG_FIELDS, VECTOR_FIELDS, ProductCatalog
+
+# Fields that can change without re-embedding; the others are also stored with the vectors
+UPDATABLE_FIELDS = [field for field in CATALOG_FIELDS if field not in VECTOR_FIELDS]
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply product updates (e.g. prices, ratings) to the product catalog; search results and LLM prompts use them immediately')
+    parser.add_argument('updates_csv', type=str, help=f'CSV with a product_id column and any of: {", ".join(UPDATABLE_FIELDS)}')
+    parser.add_argument('--catalog_path', type=str,
+                        default=os.getenv("PRODUCT_CATALOG_PATH", "database_chroma/catalog.sqlite"),
+                        help='SQLite product catalog')
+    args = parser.parse_args()
+
+    updates_df = pd.read_csv(args.updates_csv, dtype=str)
+    if 'product_id' not in updates_df.columns:
+        print("The updates file needs a product_id column")
+        return
+    fields = [column for column in updates_df.columns if column in UPDATABLE_FIELDS]
+    in_vectors = [column for column in updates_df.columns if column in VECTOR_FIELDS and column != 'product_id']
+    if in_vectors:
+        print(f"Ignoring columns that are also stored with the vectors (re-ingest the products to change them): "
+              f"{', '.join(in_vectors)}")
+    ignored = [column for column in updates_df.columns
+               if column not in fields and column not in VECTOR_FIELDS]
+    if ignored:
+        print(f"Ignoring columns that are not catalog fields: {', '.join(ignored)}")
+
+    start_time = time.time()
+    catalog = ProductCatalog(args.catalog_path)
+    updates = {
+        row['product_id']: {field: row[field] for field in fields if pd.notna(row[field])}
+        for row in updates_df.to_dict('records')
+    }
+    updated = catalog.update(updates)
+    print(f"Updated {updated} of {len(updates)} products - {time.time() - start_time:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import os
+import sqlite3
+import threading
+from src.utils import format_product_text
+from src.vector_store import VectorStore, QUERY_INCLUDE
+
+# Product fields kept in the catalog rather than in every vector collection
+CATALOG_FIELDS = ("name", "sub_category", "ratings", "no_of_ratings", "discount_price", "actual_price", "uri")
+# Fields the vector collections keep: filter fields (sub_category also routes sharded
+# queries) and the image path, which results need even without a catalog record
+VECTOR_FIELDS = ("product_id", "sub_category", "uri")
+# Stored metadata of the reduced layout has none of these; pre-catalog collections have them all
+DETAIL_FIELDS = ("name", "discount_price")
+# Records sampled at startup to check that the catalog matches the collections
+CATALOG_CHECK_SAMPLE = 20
+# SQLite's default limit on bound parameters is 999
+LOOKUP_CHUNK_SIZE = 500
+
+
+class ProductCatalog:
+    """
+    SQLite table of product details keyed by product_id.
+
+    The vector collections only keep ids and filter fields; search results
+    are completed with one bulk lookup per query batch, and price or rating
+    changes are a catalog write rather than a re-embed of both collections.
+    Each thread uses its own connection, and WAL mode lets readers run while
+    the catalog is being updated.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        columns = ", ".join(f"{field} TEXT" for field in CATALOG_FIELDS)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS products (product_id TEXT PRIMARY KEY, {columns})")
+            # Catalogs created before a field was added get the column (empty) here
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(products)")}
+            for field in CATALOG_FIELDS:
+                if field not in existing:
+                    conn.execute(f"ALTER TABLE products ADD COLUMN {field} TEXT")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def upsert(self, records):
+        """
+        Insert or replace products.
+
+        Args:
+            records: Iterable of dicts with 'product_id' and any CATALOG_FIELDS
+        """
+        rows = [(str(record["product_id"]),) + tuple(
+                    None if record.get(field) is None else str(record.get(field)) for field in CATALOG_FIELDS)
+                for record in records if record and record.get("product_id") is not None]
+        placeholders = ", ".join("?" for _ in range(len(CATALOG_FIELDS) + 1))
+        with self._connection() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO products (product_id, {', '.join(CATALOG_FIELDS)}) VALUES ({placeholders})",
+                rows
+            )
+        return len(rows)
+
+    def update(self, updates):
+        """
+        Update some fields of existing products (e.g. prices or ratings).
+
+        Args:
+            updates: dict of product_id -> dict of CATALOG_FIELDS to change,
+                except VECTOR_FIELDS, which are also stored with the vectors
+                (for filtering and shard routing) and need a re-ingest
+
+        Returns:
+            Number of products updated
+        """
+        for fields in updates.values():
+            unknown = set(fields) - set(CATALOG_FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown catalog fields: {sorted(unknown)}")
+            in_vectors = set(fields) & set(VECTOR_FIELDS)
+            if in_vectors:
+                raise ValueError(f"{sorted(in_vectors)} are also stored with the vectors; "
+                                 f"re-ingest the products to change them")
+        updated = 0
+        with self._connection() as conn:
+            for product_id, fields in updates.items():
+                if not fields:
+                    continue
+                assignments = ", ".join(f"{field} = ?" for field in fields)
+                cursor = conn.execute(f"UPDATE products SET {assignments} WHERE product_id = ?",
+                                      [None if value is None else str(value) for value in fields.values()]
+                                      + [str(product_id)])
+                updated += cursor.rowcount
+        return updated
+
+    def lookup(self, product_ids):
+        """
+        Bulk lookup of products.
+
+        Args:
+            product_ids: List of product ids (duplicates allowed)
+
+        Returns:
+            dict of product_id -> record dict for the ids found
+        """
+        unique_ids = list(dict.fromkeys(str(product_id) for product_id in product_ids))
+        conn = self._connection()
+        records = {}
+        for start in range(0, len(unique_ids), LOOKUP_CHUNK_SIZE):
+            chunk = unique_ids[start:start + LOOKUP_CHUNK_SIZE]
+            placeholders = ", ".join("?" for _ in chunk)
+            for row in conn.execute(f"SELECT * FROM products WHERE product_id IN ({placeholders})", chunk):
+                records[row["product_id"]] = {key: row[key] for key in row.keys() if row[key] is not None}
+        return records
+
+
+def split_metadata(metadata):
+    """Part of a product's metadata kept in the vector collections."""
+    return {key: value for key, value in (metadata or {}).items()
+            if key in VECTOR_FIELDS or key not in CATALOG_FIELDS}
+
+
+class CatalogVectorStore(VectorStore):
+    """
+    Wraps a VectorStore whose records keep only ids and filter fields.
+
+    Added metadata is written to the catalog in full and to the store in
+    reduced form; metadata returned by query and get is completed from the
+    catalog with one lookup per call, and stored product texts are re-rendered
+    from the catalog record so prompts show current prices and ratings.
+    Records missing from the catalog keep the metadata and text stored with
+    their vectors, so databases written before the catalog existed still work.
+    """
+
+    def __init__(self, store, catalog):
+        self.store = store
+        self.catalog = catalog
+        self.name = store.name
+
+    def __getattr__(self, attr):
+        return getattr(self.store, attr)
+
+    def count(self):
+        return self.store.count()
+
+    def embed(self, texts=None, images=None):
+        return self.store.embed(texts=texts, images=images)
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None, uris=None):
+        if metadatas is None:
+            self.store.add(ids, embeddings=embeddings, documents=documents, uris=uris)
+            return
+        self.store.add(ids, embeddings=embeddings, documents=documents,
+                       metadatas=[split_metadata(metadata) for metadata in metadatas], uris=uris)
+        self.catalog.upsert(dict(metadata or {}, product_id=(metadata or {}).get("product_id", doc_id))
+                            for doc_id, metadata in zip(ids, metadatas))
+
+    def check_catalog(self):
+        """
+        Raise ValueError when the collection stores reduced metadata but the
+        catalog has none of a sample of its products (e.g. an empty or wrong
+        PRODUCT_CATALOG_PATH), since results would lack product details.
+        """
+        sample = self.store.get(limit=CATALOG_CHECK_SAMPLE, include=['metadatas'])
+        reduced = [doc_id for doc_id, metadata in zip(sample['ids'], sample['metadatas'])
+                   if not any(field in (metadata or {}) for field in DETAIL_FIELDS)]
+        if reduced and not self.catalog.lookup(reduced):
+            raise ValueError(f"{self.name} stores product details in the catalog, but {self.catalog.path} "
+                             f"has none of its products; point PRODUCT_CATALOG_PATH at the catalog "
+                             f"written with this database")
+
+    def _hydrate(self, results, nested):
+        """Complete metadatas (and product texts) of get (nested=False) or query (nested=True) results."""
+        ids = results['ids'] if nested else [results['ids']]
+        records = self.catalog.lookup(doc_id for query_ids in ids for doc_id in query_ids)
+        for key in ('metadatas', 'documents'):
+            if results.get(key) is None:
+                continue
+            values = results[key] if nested else [results[key]]
+            if key == 'metadatas':
+                values = [[{**(metadata or {}), **records.get(doc_id, {})}
+                           for doc_id, metadata in zip(query_ids, query_values)]
+                          for query_ids, query_values in zip(ids, values)]
+            else:
+                values = [[format_product_text(records[doc_id]) if document is not None and doc_id in records
+                           else document for doc_id, document in zip(query_ids, query_values)]
+                          for query_ids, query_values in zip(ids, values)]
+            results[key] = values if nested else values[0]
+        return results
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=['metadatas', 'documents']):
+        results = self.store.get(ids=ids, where=where, limit=limit, offset=offset, include=include)
+        return self._hydrate(results, nested=False)
+
+    def query(self, query_texts=None, query_images=None, query_embeddings=None,
+              n_results=10, where=None, include=QUERY_INCLUDE):
+        results = self.store.query(query_texts=query_texts, query_images=query_images,
+                                   query_embeddings=query_embeddings, n_results=n_results,
+                                   where=where, include=include)
+        return self._hydrate(results, nested=True)
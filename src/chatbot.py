@@ -1,19 +1,55 @@
+import time
+import queue
 import base64
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
 from langchain.prompts import ChatPromptTemplate
+from src.vector_store import QUERY_INCLUDE
+from src.embedding_service import BatchedEmbeddingStore
 
 
 load_dotenv()
 
 class ELectronicsChatbot:
-    def __init__(self, text_collection, image_collection):
+    # LLM calls run here when a latency budget is set; a call that misses its deadline is
+    # abandoned (it ends with the client's own timeout) and its slot is freed then
+    _llm_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="llm")
+
+    def __init__(self, text_collection, image_collection, collapse_duplicates=False, llm=None,
+                 embed_batch_size=None, embed_wait_ms=2, latency_budget=None, hedge_after=None):
+        # With embed_batch_size, concurrent queries' texts/images are embedded in shared batches
+        if embed_batch_size:
+            text_collection = BatchedEmbeddingStore(text_collection, embed_batch_size, embed_wait_ms)
+            image_collection = BatchedEmbeddingStore(image_collection, embed_batch_size, embed_wait_ms)
         self.text_collection = text_collection
         self.image_collection = image_collection
+        # Show one result per near-duplicate image group (see 'dup_group' metadata)
+        self.collapse_duplicates = collapse_duplicates
+        # Any chat model / runnable; defaults to gpt-4o (a stand-in is used for load tests)
+        self.llm = llm
+        # Seconds a query may take end to end (retrieval + answer) before a
+        # retrieval-only answer is returned; a second LLM call is raced
+        # against the first after hedge_after seconds
+        self.latency_budget = latency_budget
+        self.hedge_after = hedge_after
+        self.deadline_stats = Counter()
+        self._stats_lock = threading.Lock()
         self.qa_chain = self.setup_qa_chain()
 
+    def close(self):
+        """Stop the embedding batcher threads, if any."""
+        for collection in (self.text_collection, self.image_collection):
+            if isinstance(collection, BatchedEmbeddingStore):
+                collection.close()
+
     def query(self, question):
+        start_time = time.perf_counter()
+
         # Query text collection
         text_content, text_metadatas, text_uris = self.query_db_uris(question, db_type="text")
         
@@ -25,10 +61,11 @@ class ELectronicsChatbot:
                                          text_metadatas=text_metadatas, image_metadatas=image_metadatas)
         
         # Get response from QA chain
-        answer = self.qa_chain.invoke(inputs)
+        answer, degraded = self.generate_answer(inputs, text_metadatas + image_metadatas, start_time)
         
         return {
             "answer": answer,
+            "degraded": degraded,
             "text_content": text_content,
             "text_metadatas": text_metadatas,
             "text_uris": text_uris,
@@ -37,6 +74,8 @@ class ELectronicsChatbot:
         }
     
     def query_image(self, image_npy):
+        start_time = time.perf_counter()
+
         # Query image collection
         image_uris, image_metadatas, image_uris = self.query_image_db_uris(image_npy)
         
@@ -44,10 +83,11 @@ class ELectronicsChatbot:
         inputs = self.format_prompt_inputs(image_npy, images=image_uris, image_metadatas=image_metadatas)
         
         # Get response from QA chain
-        answer = self.qa_chain.invoke(inputs)
+        answer, degraded = self.generate_answer(inputs, image_metadatas, start_time)
         
         return {
             "answer": answer,
+            "degraded": degraded,
             "text_content": ['No text content found'],
             "text_metadatas": ['No text metadata found'],
             "text_uris": ['No text uri found'],
@@ -55,15 +95,108 @@ class ELectronicsChatbot:
             "image_metadatas": image_metadatas
         }
 
+    def query_multimodal(self, question, image_npy, image_weight=0.5):
+        """
+        Answer a question about an uploaded image (e.g. "find this in black") in one retrieval round.
+
+        Args:
+            question: User's question
+            image_npy: numpy array of the uploaded image
+            image_weight: Weight of the image embedding in the fused image query (0-1)
+
+        Returns:
+            dict: Same shape as query()
+        """
+        start_time = time.perf_counter()
+
+        # Query text collection
+        text_content, text_metadatas, text_uris = self.query_db_uris(question, db_type="text")
+
+        # Query image collection with the fused question + image embedding
+        image_uris, image_metadatas, image_uris = self.query_fused_db_uris(question, image_npy, image_weight)
+
+        # Format inputs for the prompt
+        inputs = self.format_prompt_inputs(question, texts=text_content, images=image_uris,
+                                         text_metadatas=text_metadatas, image_metadatas=image_metadatas)
+
+        # Get response from QA chain
+        answer, degraded = self.generate_answer(inputs, image_metadatas + text_metadatas, start_time)
+
+        return {
+            "answer": answer,
+            "degraded": degraded,
+            "text_content": text_content,
+            "text_metadatas": text_metadatas,
+            "text_uris": text_uris,
+            "image_uris": image_uris,
+            "image_metadatas": image_metadatas
+        }
+
+    def retrieve(self, question=None, image_npy=None, max_results=5, image_weight=0.5):
+        """
+        Retrieval only (no LLM call).
+
+        Args:
+            question: Question text (optional if an image is given)
+            image_npy: numpy array of an image (optional)
+            max_results: maximum number of results per collection
+            image_weight: Weight of the image embedding when both are given
+
+        Returns:
+            dict: Raw query results for the "text" collection (None without a
+            question) and the "image" collection
+        """
+        if not question and image_npy is None:
+            raise ValueError("retrieve() needs a question or an image")
+        text_results = None
+        if question:
+            text_results = self.text_collection.query(
+                query_texts=[question],
+                include=QUERY_INCLUDE,
+                n_results=max_results
+            )
+        if image_npy is not None and question:
+            image_results = self._query_image_collection(
+                max_results, query_embeddings=[self.fused_query_embedding(question, image_npy, image_weight).tolist()]
+            )
+        elif image_npy is not None:
+            image_results = self._query_image_collection(max_results, query_images=[image_npy])
+        else:
+            image_results = self._query_image_collection(max_results, query_texts=[question])
+        return {"text": text_results, "image": image_results}
+
+    def retrieve_batch(self, questions, max_results=5):
+        """
+        Retrieval only for many questions, embedded and searched as one batch per collection.
+
+        Returns:
+            List of dicts shaped like retrieve()'s, one per question
+        """
+        text_results = self.text_collection.query(
+            query_texts=questions,
+            include=QUERY_INCLUDE,
+            n_results=max_results
+        )
+        image_results = self._query_image_collection(max_results, query_texts=questions)
+        return [{"text": self._select_query(text_results, i), "image": self._select_query(image_results, i)}
+                for i in range(len(questions))]
+
+    def _select_query(self, results, i):
+        """Results of the i-th query of a batched query, in single-query shape."""
+        return {key: [results[key][i]] for key in ('ids', 'distances', 'metadatas', 'documents', 'uris')
+                if results.get(key) is not None}
+
     def query_db_uris(self, query_text, db_type="text", max_results=5):
         if not isinstance(query_text, list):
             query_text = [query_text]
-        collection = self.text_collection if db_type == "text" else self.image_collection
-        results = collection.query(
-            query_texts=query_text, 
-            include=['data', 'documents', 'distances', 'metadatas', 'uris'], 
-            n_results=max_results
-        )
+        if db_type == "image":
+            results = self._query_image_collection(max_results, query_texts=query_text)
+        else:
+            results = self.text_collection.query(
+                query_texts=query_text, 
+                include=QUERY_INCLUDE, 
+                n_results=max_results
+            )
         filtered_content = []
         text_uris = []
         if db_type == "text":
@@ -93,17 +226,229 @@ class ELectronicsChatbot:
         if not isinstance(query_image, list):
             query_image = [query_image]
 
-        collection = self.image_collection
-        results = collection.query(
-            query_images=query_image, 
-            include=['data', 'documents', 'distances', 'metadatas', 'uris'], 
-            n_results=max_results
-        )
+        results = self._query_image_collection(max_results, query_images=query_image)
         filtered_content = []
         for uri in results['uris'][0]:
             filtered_content.append(uri)
         return filtered_content, results['metadatas'][0], results['uris'][0]
 
+    def query_fused_db_uris(self, query_text, query_image, image_weight=0.5, max_results=5):
+        """
+        Query the image collection with a weighted sum of the CLIP text and image embeddings.
+
+        Args:
+            query_text: Question text
+            query_image: numpy array of the image
+            image_weight: Weight of the image embedding (0-1)
+            max_results: maximum number of results to return
+
+        Returns:
+            Tuple of (filtered_content, metadatas, uris)
+        """
+        fused = self.fused_query_embedding(query_text, query_image, image_weight)
+        results = self._query_image_collection(max_results, query_embeddings=[fused.tolist()])
+        return list(results['uris'][0]), results['metadatas'][0], results['uris'][0]
+
+    def fused_query_embedding(self, query_text, query_image, image_weight=0.5):
+        """Normalized weighted sum of the CLIP text and image embeddings."""
+        text_embedding = self.image_collection.embed(texts=[query_text])[0]
+        image_embedding = self.image_collection.embed(images=[query_image])[0]
+        fused = ((1 - image_weight) * text_embedding / np.linalg.norm(text_embedding)
+                 + image_weight * image_embedding / np.linalg.norm(image_embedding))
+        return fused / np.linalg.norm(fused)
+
+    def _query_image_collection(self, max_results, **query):
+        results = self.image_collection.query(
+            include=QUERY_INCLUDE,
+            n_results=max_results * 3 if self.collapse_duplicates else max_results,
+            **query
+        )
+        if self.collapse_duplicates:
+            results = self._collapse_duplicate_results(results, max_results)
+        return results
+
+    def _collapse_duplicate_results(self, results, max_results):
+        """Keep the best hit of each duplicate group, up to max_results hits per query."""
+        keep_per_query = []
+        for ids, metadatas in zip(results['ids'], results['metadatas']):
+            keep, seen_groups = [], set()
+            for i, (doc_id, metadata) in enumerate(zip(ids, metadatas)):
+                group = (metadata or {}).get('dup_group', doc_id)
+                if group not in seen_groups:
+                    seen_groups.add(group)
+                    keep.append(i)
+                if len(keep) == max_results:
+                    break
+            keep_per_query.append(keep)
+        for key in ('ids', 'distances', 'metadatas', 'documents', 'uris'):
+            if results.get(key) is not None:
+                results[key] = [[hits[i] for i in keep] for hits, keep in zip(results[key], keep_per_query)]
+        return results
+
+    def generate_answer(self, inputs, metadatas, start_time=None):
+        """
+        Run the QA chain within the latency budget.
+
+        Without a budget this is a plain qa_chain.invoke. With one, the call is
+        abandoned when the deadline (start_time + latency_budget) passes and a
+        templated answer listing the retrieved products is returned instead.
+        With hedge_after, a second call is started if the first has not
+        finished (or has failed) by then, and the first result wins.
+
+        Args:
+            inputs: Prompt inputs from format_prompt_inputs
+            metadatas: Metadata of the retrieved products, best first
+            start_time: time.perf_counter() at the start of the request
+
+        Returns:
+            Tuple of (answer, degraded)
+        """
+        if self.latency_budget is None:
+            return self.qa_chain.invoke(inputs), False
+
+        deadline = (start_time or time.perf_counter()) + self.latency_budget
+        hedge_at = time.perf_counter() + self.hedge_after if self.hedge_after is not None else None
+        pending = set()
+        if time.perf_counter() < deadline:
+            pending.add(self._llm_executor.submit(self.qa_chain.invoke, inputs))
+        while pending:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            wake = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, pending = wait(pending, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    self._count("answered")
+                    return future.result(), False
+                self._count("llm_errors")
+                print(f"LLM call failed: {type(future.exception()).__name__}: {future.exception()}")
+            if hedge_at is not None and (time.perf_counter() >= hedge_at or not pending):
+                hedge_at = None
+                if time.perf_counter() < deadline:
+                    pending.add(self._llm_executor.submit(self.qa_chain.invoke, inputs))
+                    self._count("hedged")
+        for future in pending:
+            future.cancel()
+
+        return self._fallback_answer(metadatas, deadline), True
+
+    def stream_answer(self, inputs, metadatas, start_time=None):
+        """
+        Stream the QA chain's answer within the latency budget.
+
+        Chunks are yielded as they arrive. When the deadline passes or the call
+        fails, streaming stops and the templated answer listing the retrieved
+        products is yielded last, flagged as degraded. With hedge_after, a
+        second call is started if no chunk has arrived by then (or the first
+        call failed), and the first call to produce a chunk is streamed.
+
+        Args:
+            inputs: Prompt inputs from format_prompt_inputs
+            metadatas: Metadata of the retrieved products, best first
+            start_time: time.perf_counter() at the start of the request
+
+        Yields:
+            Tuples of (text, degraded)
+        """
+        if self.latency_budget is None:
+            for chunk in self.qa_chain.stream(inputs):
+                yield chunk, False
+            return
+
+        deadline = (start_time or time.perf_counter()) + self.latency_budget
+        hedge_at = time.perf_counter() + self.hedge_after if self.hedge_after is not None else None
+        events = queue.Queue()
+        abandoned = threading.Event()
+        streaming = None
+        pending = set()
+
+        def run(call):
+            try:
+                for chunk in self.qa_chain.stream(inputs):
+                    if abandoned.is_set() or streaming not in (None, call):
+                        return
+                    events.put((call, "chunk", chunk))
+                events.put((call, "done", None))
+            except Exception as e:
+                events.put((call, "error", e))
+
+        def start(call):
+            pending.add(call)
+            self._llm_executor.submit(run, call)
+
+        try:
+            if time.perf_counter() < deadline:
+                start(0)
+            while pending:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                wake = deadline if hedge_at is None else min(deadline, hedge_at)
+                try:
+                    call, kind, value = events.get(timeout=max(0.0, wake - now))
+                except queue.Empty:
+                    call = None
+                if call in pending:
+                    if kind == "chunk":
+                        # Stream this call; any other one is abandoned
+                        streaming, hedge_at = call, None
+                        pending.intersection_update({call})
+                        yield value, False
+                    elif kind == "done":
+                        self._count("answered")
+                        return
+                    else:
+                        pending.discard(call)
+                        self._count("llm_errors")
+                        print(f"LLM call failed: {type(value).__name__}: {value}")
+                        if streaming is not None:
+                            break
+                if hedge_at is not None and (time.perf_counter() >= hedge_at or not pending):
+                    hedge_at = None
+                    if time.perf_counter() < deadline:
+                        start(1)
+                        self._count("hedged")
+        finally:
+            # Also reached when the client disconnects and the generator is closed
+            abandoned.set()
+
+        yield self._fallback_answer(metadatas, deadline), True
+
+    def _fallback_answer(self, metadatas, deadline):
+        """Retrieval-only answer after the deadline passed ("degraded") or every LLM call failed ("failed")."""
+        if time.perf_counter() >= deadline:
+            self._count("degraded")
+            print(f"Answer missed the {self.latency_budget:.1f}s deadline, returning retrieval results only")
+        else:
+            self._count("failed")
+            print("LLM call failed, returning retrieval results only")
+        return self.retrieval_only_answer(metadatas)
+
+    def _count(self, event):
+        with self._stats_lock:
+            self.deadline_stats[event] += 1
+
+    def retrieval_only_answer(self, metadatas, max_products=3):
+        """Templated answer listing the best retrieved products, used when the LLM is too slow."""
+        products, seen = [], set()
+        for metadata in metadatas or []:
+            if not metadata or metadata.get('product_id') in seen:
+                continue
+            seen.add(metadata.get('product_id'))
+            products.append(f"{metadata.get('name', 'Unnamed product')} (product_id {metadata.get('product_id', 'N/A')}), "
+                            f"priced at ${metadata.get('discount_price', 'N/A')} and rated {metadata.get('ratings', 'N/A')}")
+            if len(products) == max_products:
+                break
+        if not products:
+            return "Sorry, I couldn't answer in time and found no matching products. Please try again."
+        answer = f"Sorry, I couldn't write a full answer in time. The closest match is {products[0]}."
+        if len(products) > 1:
+            answer += " Alternatives are " + "; ".join(products[1:]) + "."
+        return answer
+
     def format_prompt_inputs(self, user_query, texts=None, images=None, text_metadatas=None, image_metadatas=None):
         """
         Format inputs for the QA prompt.
@@ -150,6 +495,17 @@ class ELectronicsChatbot:
         
         return inputs
 
+    def format_retrieved_inputs(self, question, retrieved):
+        """Format results from retrieve() for the QA prompt, like query() does."""
+        text_results, image_results = retrieved["text"], retrieved["image"]
+        texts, text_metadatas = None, None
+        if text_results is not None:
+            texts = list(enumerate(text_results['documents'][0]))
+            text_metadatas = text_results['metadatas'][0]
+        return self.format_prompt_inputs(question, texts=texts, images=image_results['uris'][0],
+                                         text_metadatas=text_metadatas,
+                                         image_metadatas=image_results['metadatas'][0])
+
     def setup_qa_chain(self):
         template = """
         You are a helpful shopping assistant. Use the following product information to answer the question, while answering the question use metadata to supplement your answer. Provide one main answer and one alternative answers
@@ -193,6 +549,11 @@ class ELectronicsChatbot:
              ),
         ])
         
-        llm = ChatOpenAI(temperature=0.3, model="gpt-4o")
+        # Abandoned calls end with the client timeout, so they do not hold an executor slot for long.
+        # With hedging the client does not retry: a failed call is re-raced by the hedge instead
+        client_options = {"timeout": self.latency_budget} if self.latency_budget else {}
+        if self.latency_budget and self.hedge_after is not None:
+            client_options["max_retries"] = 0
+        llm = self.llm or ChatOpenAI(temperature=0.3, model="gpt-4o", **client_options)
         parser = StrOutputParser()
         return prompt | llm | parser 
\ No newline at end of file
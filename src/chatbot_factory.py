@@ -0,0 +1,37 @@
+import os
+import threading
+from dotenv import load_dotenv
+from src.chatbot import ELectronicsChatbot
+from src.db_manager import DatabaseManager
+
+load_dotenv()
+
+
+def initialize_chatbot():
+    """Initialize the chatbot with database connections, configured from environment variables"""
+    db_manager = DatabaseManager()
+    return ELectronicsChatbot(
+        db_manager.text_collection,
+        db_manager.image_collection,
+        collapse_duplicates=os.getenv("COLLAPSE_DUPLICATE_IMAGES", "0") == "1",
+        embed_batch_size=int(os.getenv("EMBED_MAX_BATCH_SIZE", "32")),
+        embed_wait_ms=float(os.getenv("EMBED_MAX_WAIT_MS", "2")),
+        latency_budget=float(os.getenv("CHAT_LATENCY_BUDGET_SECS", "20")) or None,
+        hedge_after=float(os.getenv("LLM_HEDGE_AFTER_SECS", "0")) or None
+    )
+
+
+_shared_chatbot = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_chatbot():
+    """
+    The process-wide chatbot, created on first use. Handlers called without a
+    chatbot use it, so databases, models and embedding batchers are set up once.
+    """
+    global _shared_chatbot
+    with _shared_lock:
+        if _shared_chatbot is None:
+            _shared_chatbot = initialize_chatbot()
+        return _shared_chatbot
@@ -0,0 +1,42 @@
+import threading
+import chromadb
+from chromadb.config import Settings
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_chroma_client(mode="persistent", path=None, host="localhost", port=8000,
+                      max_connections=None, keepalive_secs=40.0):
+    """
+    Return the process-wide Chroma client for a location, creating it on first use.
+
+    Every DatabaseManager in a process reuses the same client (and with it the
+    same SQLite/HNSW handles or HTTP connection pool) instead of opening its own.
+
+    Args:
+        mode: "persistent" for an on-disk database, "http" for a Chroma server
+        path: Database directory (persistent mode)
+        host: Server host (http mode)
+        port: Server port (http mode)
+        max_connections: Size of the HTTP connection pool (http mode)
+        keepalive_secs: How long idle HTTP connections are kept open (http mode)
+
+    Returns:
+        chromadb client
+    """
+    key = (mode, path) if mode == "persistent" else (mode, host, int(port))
+    with _CLIENTS_LOCK:
+        if key not in _CLIENTS:
+            if mode == "persistent":
+                _CLIENTS[key] = chromadb.PersistentClient(path=path)
+            elif mode == "http":
+                settings = Settings(
+                    chroma_http_keepalive_secs=keepalive_secs,
+                    chroma_http_max_connections=max_connections,
+                    chroma_http_max_keepalive_connections=max_connections,
+                )
+                _CLIENTS[key] = chromadb.HttpClient(host=host, port=int(port), settings=settings)
+            else:
+                raise ValueError(f"Unknown Chroma client mode: {mode}")
+        return _CLIENTS[key]
@@ -1,53 +1,166 @@
 import os
-from chromadb.config import Settings
-import chromadb
 from chromadb.utils import embedding_functions
 from chromadb.utils.embedding_functions import OpenCLIPEmbeddingFunction
-from chromadb.utils.data_loaders import ImageLoader
 import logging
+import numpy as np
 from src.utils import create_product_document
+from src.image_loader import DraftImageLoader
+from src.chroma_client import get_chroma_client
+from src.snapshot import export_collection, import_collection
+from src.vector_store import ChromaVectorStore, MemmapVectorStore, ShardedVectorStore
+from src.sharding import SHARD_SEPARATOR, shard_collection_name
+from src.catalog import ProductCatalog, CatalogVectorStore
+from src.image_dedup import group_duplicate_images, duplicate_clusters, write_duplicate_report
+from src.profiling import profiled, trace_allocations
 
 logging.basicConfig(level=logging.ERROR)
 
 class DatabaseManager:
-    def __init__(self):
-        self.text_collection = self.initialize_chroma_db("database_chroma/text", "electronics_text_dataset", is_image=False)
-        self.image_collection = self.initialize_chroma_db("database_chroma/images", "electronics_image_dataset")
+    def __init__(self, vector_backend=None, snapshot_dir=None, chroma_mode=None, sharding=None,
+                 catalog_path=None):
+        """
+        Args:
+            vector_backend: "chroma" (default) or "memmap"; falls back to the
+                VECTOR_BACKEND environment variable
+            snapshot_dir: Snapshot directory the memmap backend is opened from;
+                falls back to VECTOR_SNAPSHOT_DIR
+            chroma_mode: How the chroma backend is deployed; falls back to CHROMA_MODE:
+                "persistent" (default) - one on-disk database per collection directory
+                "shared" - one on-disk database at CHROMA_PATH holding both collections
+                "http" - a Chroma server at CHROMA_HOST:CHROMA_PORT
+            sharding: "category" splits each chroma collection into one collection
+                per sub_category with query routing; falls back to VECTOR_SHARDING
+            catalog_path: SQLite product catalog holding the product details the
+                collections no longer store; falls back to PRODUCT_CATALOG_PATH
+        """
+        self.vector_backend = vector_backend or os.getenv("VECTOR_BACKEND", "chroma")
+        self.chroma_mode = chroma_mode or os.getenv("CHROMA_MODE", "persistent")
+        self.chroma_timeout = float(os.getenv("CHROMA_TIMEOUT", "0")) or None
+        self.chroma_retries = int(os.getenv("CHROMA_RETRIES", "2" if self.chroma_mode == "http" else "0"))
+        self.sharding = sharding or os.getenv("VECTOR_SHARDING") or None
+        if self.sharding not in (None, "category"):
+            raise ValueError(f"Unknown sharding: {self.sharding}")
+        if self.vector_backend == "chroma" and self.sharding == "category":
+            self.text_collection = self.initialize_sharded_chroma_db("database_chroma/text", "electronics_text_dataset", is_image=False)
+            self.image_collection = self.initialize_sharded_chroma_db("database_chroma/images", "electronics_image_dataset")
+        elif self.vector_backend == "chroma":
+            self.text_collection = self.initialize_chroma_db("database_chroma/text", "electronics_text_dataset", is_image=False)
+            self.image_collection = self.initialize_chroma_db("database_chroma/images", "electronics_image_dataset")
+        elif self.vector_backend == "memmap":
+            snapshot_dir = snapshot_dir or os.getenv("VECTOR_SNAPSHOT_DIR", "data/snapshots/latest")
+            self.text_collection = self.initialize_memmap_store(os.path.join(snapshot_dir, "text"), is_image=False)
+            self.image_collection = self.initialize_memmap_store(os.path.join(snapshot_dir, "images"))
+        else:
+            raise ValueError(f"Unknown vector backend: {self.vector_backend}")
+        self.catalog = ProductCatalog(catalog_path or os.getenv("PRODUCT_CATALOG_PATH", "database_chroma/catalog.sqlite"))
+        self.text_collection = CatalogVectorStore(self.text_collection, self.catalog)
+        self.image_collection = CatalogVectorStore(self.image_collection, self.catalog)
+        self.text_collection.check_catalog()
+        self.image_collection.check_catalog()
 
-    def initialize_chroma_db(self, db_path, collection_name, is_image=True):
+    def create_embedding_function(self, is_image=True):
         if is_image:
-            embedding_function = OpenCLIPEmbeddingFunction()
-            image_loader = ImageLoader()
-        else:
-            embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name="all-MiniLM-L6-v2"
-            )
-            image_loader = None
+            return OpenCLIPEmbeddingFunction()
+        return embedding_functions.SentenceTransformerEmbeddingFunction(
+            model_name="all-MiniLM-L6-v2"
+        )
 
-        chroma_client = chromadb.PersistentClient(path=db_path)
+    def initialize_chroma_db(self, db_path, collection_name, is_image=True):
+        embedding_function = self.create_embedding_function(is_image)
+        image_loader = DraftImageLoader() if is_image else None
+        store = self.open_chroma_collection(db_path, collection_name, embedding_function, image_loader)
+        print(f"Current collection size: {store.count()} items")
+        return store
+
+    def open_chroma_collection(self, db_path, collection_name, embedding_function, image_loader=None, metadata=None):
+        chroma_client = self.get_chroma_client(db_path)
         collection = chroma_client.get_or_create_collection(
             name=collection_name,
             embedding_function=embedding_function,
             data_loader=image_loader,
-            metadata={"source": collection_name},
+            metadata={"source": collection_name, **(metadata or {})},
+        )
+        return ChromaVectorStore(collection, embedding_function, image_loader,
+                                 timeout=self.chroma_timeout, retries=self.chroma_retries)
+
+    def initialize_sharded_chroma_db(self, db_path, collection_name, is_image=True):
+        """
+        Open the per-sub_category shards of a collection (named
+        <collection_name>__<category>) as one ShardedVectorStore.
+        New shards are created as products of new categories are added.
+        """
+        embedding_function = self.create_embedding_function(is_image)
+        image_loader = DraftImageLoader() if is_image else None
+        prefix = collection_name + SHARD_SEPARATOR
+        shards = {}
+        for collection in self.get_chroma_client(db_path).list_collections():
+            if collection.name.startswith(prefix):
+                shard = self.open_chroma_collection(db_path, collection.name, embedding_function, image_loader)
+                shards[(shard.metadata or {}).get("category", collection.name[len(prefix):])] = shard
+
+        def create_shard(category):
+            return self.open_chroma_collection(db_path, shard_collection_name(collection_name, category),
+                                               embedding_function, image_loader, metadata={"category": category})
+
+        store = ShardedVectorStore(
+            collection_name, shards, create_shard, embedding_function, image_loader,
+            max_shards=int(os.getenv("SHARD_MAX_ROUTES", "2")),
+            margin=float(os.getenv("SHARD_ROUTING_MARGIN", "0.05")),
+            min_similarity=float(os.getenv("SHARD_MIN_SIMILARITY", "0.2"))
         )
-        print(f"Current collection size: {collection.count()} items")
-        return collection
+        print(f"Current collection size: {store.count()} items in {len(shards)} shards")
+        return store
+
+    def get_chroma_client(self, db_path):
+        """Return the pooled client for a collection directory under the configured chroma_mode."""
+        if self.chroma_mode == "persistent":
+            return get_chroma_client("persistent", path=db_path)
+        if self.chroma_mode == "shared":
+            return get_chroma_client("persistent", path=os.getenv("CHROMA_PATH", "database_chroma/shared"))
+        if self.chroma_mode == "http":
+            max_connections = os.getenv("CHROMA_MAX_CONNECTIONS")
+            return get_chroma_client(
+                "http",
+                host=os.getenv("CHROMA_HOST", "localhost"),
+                port=int(os.getenv("CHROMA_PORT", "8000")),
+                max_connections=int(max_connections) if max_connections else None
+            )
+        raise ValueError(f"Unknown Chroma mode: {self.chroma_mode}")
+
+    def initialize_memmap_store(self, snapshot_dir, is_image=True):
+        # VECTOR_COMPACT=float16|pq searches a compact copy first and re-scores a shortlist exactly
+        store = MemmapVectorStore.from_snapshot(
+            snapshot_dir, self.create_embedding_function(is_image),
+            compact=os.getenv("VECTOR_COMPACT") or None,
+            rescore_factor=int(os.getenv("VECTOR_RESCORE_FACTOR", "10"))
+        )
+        print(f"Current collection size: {store.count()} items")
+        return store
 
     def check_existing_ids(self, collection, ids):
         existing_ids = set()
         if collection.count() > 0:
-            all_results = collection.query(
-                query_texts=[""], 
-                n_results=collection.count(),
-                include=[]
-            )
-            existing_ids = set(all_results['ids'][0])
+            existing_ids = set(collection.get(ids=ids, include=[])['ids'])
         return [id for id in ids if id not in existing_ids]
 
-    def add_products_to_db(self, products_df, image_folder_path=None, batch_size=5000):
+    def update_routers(self):
+        """Refresh the category centroids of sharded collections after adding records."""
+        for store in (self.text_collection, self.image_collection):
+            if hasattr(store, "update_router"):
+                store.update_router()
+
+    @profiled("ingest")
+    def add_products_to_db(self, products_df, image_folder_path=None, batch_size=5000,
+                           dedup_images=False, duplicate_report_path=None, near_duplicate_distance=None):
         """
         Process products and add them to both text and image collections.
+
+        With dedup_images, byte-identical images are embedded once and the
+        vector is shared across the group's ids; each image then carries a
+        'dup_group' metadata field naming the group's representative
+        product_id. near_duplicate_distance also groups images whose
+        perceptual hash is within that many bits of the representative's and
+        whose colours match (see group_duplicate_images).
         """
         documents, metadata, ids, image_uris = [], [], [], []
         
@@ -68,7 +181,9 @@ class DatabaseManager:
         # Add to image collection
         print("Processing image collection...")
         new_image_ids = self.check_existing_ids(self.image_collection, ids)
-        self._batch_add_images(image_uris, metadata, ids, new_image_ids, batch_size)
+        self._batch_add_images(image_uris, metadata, ids, new_image_ids, batch_size,
+                               dedup_images, duplicate_report_path, near_duplicate_distance)
+        self.update_routers()
 
         print(f"Text Collection Size: {self.text_collection.count()}")
         print(f"Image Collection Size: {self.image_collection.count()}")
@@ -82,25 +197,92 @@ class DatabaseManager:
             batch_meta = new_metadata[i:i + batch_size]
             batch_ids = new_ids[i:i + batch_size]
             
-            self.text_collection.add(
-                documents=batch_docs,
-                metadatas=batch_meta,
-                ids=batch_ids,
-            )
+            with trace_allocations(f"ingest_text_batch{i//batch_size + 1}"):
+                self.text_collection.add(
+                    documents=batch_docs,
+                    metadatas=batch_meta,
+                    ids=batch_ids,
+                )
             print(f"Added batch #{i//batch_size + 1}: {len(batch_docs)} documents")
 
-    def _batch_add_images(self, image_uris, metadata, ids, new_ids, batch_size):
-        new_uris = [uri for uri, id in zip(image_uris, ids) if id in new_ids]
-        new_metadata = [meta for meta, doc_id in zip(metadata, ids) if doc_id in new_ids]
+    def _batch_add_images(self, image_uris, metadata, ids, new_ids, batch_size,
+                          dedup=False, duplicate_report_path=None, near_duplicate_distance=None):
+        new_id_set = set(new_ids)
+        new_uris = [uri for uri, id in zip(image_uris, ids) if id in new_id_set]
+        new_metadata = [meta for meta, doc_id in zip(metadata, ids) if doc_id in new_id_set]
+
+        if dedup:
+            self._batch_add_deduplicated_images(new_uris, new_metadata, new_ids, batch_size,
+                                                duplicate_report_path, near_duplicate_distance)
+            return
         
         for i in range(0, len(new_ids), batch_size):
             batch_uris = new_uris[i:i + batch_size]
             batch_meta = new_metadata[i:i + batch_size]
             batch_ids = new_ids[i:i + batch_size]
             
-            self.image_collection.add(
-                ids=batch_ids,
-                uris=batch_uris,
-                metadatas=batch_meta
-            )
-            print(f"Added batch #{i//batch_size + 1}: {len(batch_uris)} images") 
\ No newline at end of file
+            with trace_allocations(f"ingest_image_batch{i//batch_size + 1}"):
+                self.image_collection.add(
+                    ids=batch_ids,
+                    uris=batch_uris,
+                    metadatas=batch_meta
+                )
+            print(f"Added batch #{i//batch_size + 1}: {len(batch_uris)} images")
+
+    def _batch_add_deduplicated_images(self, new_uris, new_metadata, new_ids, batch_size,
+                                       duplicate_report_path=None, near_duplicate_distance=None):
+        representatives = group_duplicate_images(new_uris, max_distance=near_duplicate_distance)
+        clusters = duplicate_clusters(new_ids, representatives)
+        print(f"Found {len(clusters)} duplicate image clusters covering "
+              f"{sum(len(members) for members in clusters.values())} images")
+        if duplicate_report_path:
+            write_duplicate_report(clusters, duplicate_report_path)
+            print(f"Duplicate report written to {duplicate_report_path}")
+
+        new_metadata = [dict(meta, dup_group=new_ids[rep]) for meta, rep in zip(new_metadata, representatives)]
+        rep_embeddings = {}
+        num_embedded = 0
+        for i in range(0, len(new_ids), batch_size):
+            batch_reps = representatives[i:i + batch_size]
+            missing = [rep for rep in dict.fromkeys(batch_reps) if rep not in rep_embeddings]
+            with trace_allocations(f"ingest_image_batch{i//batch_size + 1}"):
+                if missing:
+                    images = self.image_collection.data_loader([new_uris[rep] for rep in missing])
+                    rep_embeddings.update(zip(missing, self.image_collection.embed(images=images)))
+                    num_embedded += len(missing)
+
+                self.image_collection.add(
+                    ids=new_ids[i:i + batch_size],
+                    embeddings=np.stack([rep_embeddings[rep] for rep in batch_reps]),
+                    uris=new_uris[i:i + batch_size],
+                    metadatas=new_metadata[i:i + batch_size]
+                )
+            print(f"Added batch #{i//batch_size + 1}: {len(batch_reps)} images ({len(missing)} embedded)")
+        print(f"Embedded {num_embedded} of {len(new_ids)} images")
+
+    def export_snapshot(self, snapshot_dir, page_size=5000):
+        """
+        Export both collections to a portable snapshot directory.
+
+        Args:
+            snapshot_dir: Directory to write the snapshot into
+            page_size: Number of records fetched from a collection at a time
+
+        Returns:
+            dict: Manifests keyed by collection ("text", "images")
+        """
+        return {
+            "text": export_collection(self.text_collection, os.path.join(snapshot_dir, "text"), page_size),
+            "images": export_collection(self.image_collection, os.path.join(snapshot_dir, "images"), page_size),
+        }
+
+    def import_snapshot(self, snapshot_dir, batch_size=5000, verify=True):
+        """
+        Bulk-import a snapshot written by export_snapshot into empty collections.
+        Stored embeddings are used as-is, so no embedding model is run.
+        """
+        import_collection(self.text_collection, os.path.join(snapshot_dir, "text"), batch_size, verify)
+        import_collection(self.image_collection, os.path.join(snapshot_dir, "images"), batch_size, verify)
+        self.update_routers()
+        print(f"Text Collection Size: {self.text_collection.count()}")
+        print(f"Image Collection Size: {self.image_collection.count()}")
@@ -0,0 +1,143 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import numpy as np
+from src.vector_store import VectorStore, QUERY_INCLUDE
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent embedding calls into batched forward passes.
+
+    Callers block in embed() while a worker thread collects requests for up
+    to max_wait_ms (or until max_batch_size inputs are queued), embeds them
+    with one call to embed_function and hands each caller its own rows.
+    Under low load a request waits at most max_wait_ms extra; under high load
+    requests that queue up while a batch is running form the next batch.
+
+    The forward pass runs on the worker thread, so per-thread CPU profiles of
+    a request (see src/profiling.py) show it waiting rather than embedding.
+    """
+
+    def __init__(self, embed_function, max_batch_size=32, max_wait_ms=2, name="embedding-batcher"):
+        """
+        Args:
+            embed_function: Callable mapping a list of inputs to an (n, dim) array
+            max_batch_size: Most inputs embedded in one forward pass
+            max_wait_ms: How long to wait for more requests after the first one
+            name: Name of the worker thread
+        """
+        self.embed_function = embed_function
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._requests = queue.Queue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, daemon=True, name=name)
+        self._worker.start()
+
+    def close(self):
+        """Embed the requests already queued, then stop the worker thread."""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._requests.put(None)
+        self._worker.join()
+
+    def embed(self, inputs):
+        """Embed a list of inputs as part of a shared batch; returns an (n, dim) float32 array."""
+        inputs = list(inputs)
+        if not inputs:
+            return np.empty((0, 0), dtype=np.float32)
+        future = Future()
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._requests.put((inputs, future))
+        return future.result()
+
+    def _collect(self):
+        """Next batch of requests, and whether close() was called."""
+        request = self._requests.get()
+        if request is None:
+            return [], True
+        batch = [request]
+        size = len(request[0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+            size += len(request[0])
+        return batch, False
+
+    def _run(self):
+        closing = False
+        while not closing:
+            batch, closing = self._collect()
+            if not batch:
+                continue
+            try:
+                vectors = np.asarray(self.embed_function([item for inputs, _ in batch for item in inputs]),
+                                     dtype=np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for inputs, future in batch:
+                future.set_result(vectors[start:start + len(inputs)])
+                start += len(inputs)
+
+
+class BatchedEmbeddingStore(VectorStore):
+    """
+    Wraps a VectorStore so query texts and images are embedded through shared
+    MicroBatchers (one per input type) and searched by embedding. Everything
+    else is delegated to the wrapped store.
+    """
+
+    def __init__(self, store, max_batch_size=32, max_wait_ms=2):
+        self.store = store
+        self.name = store.name
+        self._batchers = {
+            kind: MicroBatcher(lambda inputs, kind=kind: store.embed(**{kind: inputs}),
+                               max_batch_size, max_wait_ms, name=f"{store.name}-{kind}-batcher")
+            for kind in ("texts", "images")
+        }
+
+    def __getattr__(self, attr):
+        return getattr(self.store, attr)
+
+    def close(self):
+        """Stop the batcher threads."""
+        for batcher in self._batchers.values():
+            batcher.close()
+
+    def count(self):
+        return self.store.count()
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None, uris=None):
+        self.store.add(ids, embeddings=embeddings, documents=documents, metadatas=metadatas, uris=uris)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=['metadatas', 'documents']):
+        return self.store.get(ids=ids, where=where, limit=limit, offset=offset, include=include)
+
+    def embed(self, texts=None, images=None):
+        if texts is not None:
+            return self._batchers["texts"].embed(texts)
+        return self._batchers["images"].embed(images)
+
+    def query(self, query_texts=None, query_images=None, query_embeddings=None,
+              n_results=10, where=None, include=QUERY_INCLUDE):
+        if query_embeddings is None:
+            query_embeddings = self.embed(texts=query_texts, images=query_images).tolist()
+        return self.store.query(query_embeddings=query_embeddings, n_results=n_results,
+                                where=where, include=include)
@@ -0,0 +1,158 @@
+import json
+import hashlib
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+
+
+THUMBNAIL_SIZE = 16
+# Largest per-pixel, per-channel difference (0-255) allowed between near-duplicate thumbnails;
+# the maximum rather than the mean, so a recoloured product on a large background still differs
+MAX_COLOR_DIFFERENCE = 40
+
+
+def image_signature(image_path, hash_size=HASH_SIZE, thumbnail_size=THUMBNAIL_SIZE):
+    """
+    Compute the difference hash and a small RGB thumbnail of an image from one decode.
+
+    The hash (sign of horizontal gradients on a grayscale thumbnail) finds
+    candidates cheaply; because it ignores colour, candidates are confirmed
+    by comparing the RGB thumbnails.
+
+    Args:
+        image_path: Path to the image
+        hash_size: Hash is hash_size * hash_size bits
+        thumbnail_size: Side of the RGB thumbnail
+
+    Returns:
+        Tuple of (hash as int, thumbnail as int16 array of shape (size, size, 3))
+    """
+    with Image.open(image_path) as img:
+        # JPEGs can be decoded straight at a fraction of their size
+        side = max(hash_size, thumbnail_size) * 8
+        img.draft('RGB', (side, side))
+        img = img.convert('RGB')
+        thumbnail = np.asarray(img.resize((thumbnail_size, thumbnail_size), Image.Resampling.BILINEAR),
+                               dtype=np.int16)
+        pixels = np.asarray(
+            img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR),
+            dtype=np.int16
+        )
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(''.join('1' if bit else '0' for bit in bits), 2), thumbnail
+
+
+def dhash(image_path, hash_size=HASH_SIZE):
+    """
+    Compute a difference hash: the sign of horizontal gradients on a tiny grayscale thumbnail.
+
+    Args:
+        image_path: Path to the image
+        hash_size: Hash is hash_size * hash_size bits
+
+    Returns:
+        int: Perceptual hash of the image
+    """
+    return image_signature(image_path, hash_size)[0]
+
+
+def file_digest(image_path):
+    """Return the sha256 hex digest of the file bytes."""
+    with open(image_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def group_duplicate_images(image_uris, max_distance=None, hash_size=HASH_SIZE,
+                           max_color_difference=MAX_COLOR_DIFFERENCE):
+    """
+    Group byte-identical images, and optionally near-identical ones.
+
+    With max_distance, an image also joins a group when its perceptual hash
+    differs from the group representative's in at most max_distance bits and
+    their RGB thumbnails match (so recolourings of the same shot stay apart).
+    Images are only ever compared with representatives, so groups cannot
+    chain together images that are far from each other. Candidates are found
+    by splitting each hash into max_distance + 1 bands: two hashes within that
+    distance must agree on at least one band.
+
+    Args:
+        image_uris: List of image paths
+        max_distance: Maximum Hamming distance between near-duplicate hashes;
+            None groups byte-identical images only
+        hash_size: Hash is hash_size * hash_size bits
+        max_color_difference: Largest per-pixel difference allowed between
+            the RGB thumbnails of near duplicates
+
+    Returns:
+        List of representative indices, one per input: the index of the first
+        image of the group it belongs to (unreadable images represent themselves)
+    """
+    representatives = list(range(len(image_uris)))
+    by_digest = {}
+    num_bands = (max_distance or 0) + 1
+    band_width = -(-(hash_size * hash_size) // num_bands)
+    band_mask = (1 << band_width) - 1
+    buckets = [{} for _ in range(num_bands)]
+    signatures = {}
+
+    for i, uri in enumerate(image_uris):
+        try:
+            digest = file_digest(uri)
+            if digest in by_digest:
+                representatives[i] = by_digest[digest]
+                continue
+            by_digest[digest] = i
+            if max_distance is None:
+                continue
+
+            image_hash, thumbnail = image_signature(uri, hash_size)
+            candidates = dict.fromkeys(
+                rep for band in range(num_bands)
+                for rep in buckets[band].get((image_hash >> (band * band_width)) & band_mask, [])
+            )
+            best, best_distance = None, None
+            for rep in candidates:
+                rep_hash, rep_thumbnail = signatures[rep]
+                distance = bin(image_hash ^ rep_hash).count('1')
+                if distance > max_distance or (best_distance is not None and distance >= best_distance):
+                    continue
+                if np.abs(thumbnail - rep_thumbnail).max() <= max_color_difference:
+                    best, best_distance = rep, distance
+            if best is not None:
+                representatives[i] = best
+                by_digest[digest] = best
+                continue
+
+            signatures[i] = (image_hash, thumbnail)
+            for band in range(num_bands):
+                buckets[band].setdefault((image_hash >> (band * band_width)) & band_mask, []).append(i)
+        except Exception as e:
+            print(f"Could not hash image {uri}: {e}")
+
+    return representatives
+
+
+def duplicate_clusters(ids, representatives):
+    """
+    Collect groups with more than one member.
+
+    Returns:
+        dict: Representative id -> list of member ids (representative first)
+    """
+    clusters = {}
+    for doc_id, rep in zip(ids, representatives):
+        clusters.setdefault(ids[rep], []).append(doc_id)
+    return {rep_id: members for rep_id, members in clusters.items() if len(members) > 1}
+
+
+def write_duplicate_report(clusters, report_path):
+    """Write duplicate clusters as JSON, largest first."""
+    report = {
+        "num_clusters": len(clusters),
+        "num_duplicates": sum(len(members) - 1 for members in clusters.values()),
+        "clusters": sorted(clusters.values(), key=len, reverse=True),
+    }
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
@@ -0,0 +1,82 @@
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+# Input resolution of the OpenCLIP ViT-B-32 model used for the image collection
+CLIP_IMAGE_SIZE = 224
+
+
+def to_rgb(img, background=(255, 255, 255)):
+    """
+    Convert any PIL image to RGB consistently: grayscale is expanded, CMYK is
+    converted, and transparency is composited onto a white background.
+    """
+    if img.mode == 'RGB':
+        return img
+    if img.mode == 'P':
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    if img.mode in ('RGBA', 'LA', 'PA'):
+        img = img.convert('RGBA')
+        canvas = Image.new('RGB', img.size, background)
+        canvas.paste(img, mask=img.getchannel('A'))
+        return canvas
+    if img.mode in ('I', 'I;16', 'F'):
+        # 16-bit / float grayscale: rescale to 8 bits before expanding
+        array = np.asarray(img, dtype=np.float32)
+        span = max(float(array.max() - array.min()), 1e-6)
+        img = Image.fromarray(((array - array.min()) * (255.0 / span)).astype(np.uint8))
+    return img.convert('RGB')
+
+
+def prepare_clip_image(img, size=CLIP_IMAGE_SIZE):
+    """
+    Decode an image close to the model's input size and return a size x size RGB array.
+
+    For JPEGs that have not been decoded yet, PIL's draft mode makes the
+    decoder downscale in the DCT domain (by 1/2, 1/4 or 1/8) to the smallest
+    size that still covers the target, so most of the full-resolution decode
+    is skipped. The result is then resized (shorter side to size, bicubic) and
+    center-cropped like CLIP's own preprocessing, which leaves that step a no-op.
+
+    Args:
+        img: PIL image (ideally freshly opened and not yet loaded)
+        size: Output side length
+
+    Returns:
+        uint8 numpy array of shape (size, size, 3)
+    """
+    img.draft('RGB', (size, size))
+    img = to_rgb(img)
+    width, height = img.size
+    scale = size / min(width, height)
+    resized = (max(size, round(width * scale)), max(size, round(height * scale)))
+    if resized != img.size:
+        img = img.resize(resized, Image.Resampling.BICUBIC)
+    left, top = (resized[0] - size) // 2, (resized[1] - size) // 2
+    return np.asarray(img.crop((left, top, left + size, top + size)))
+
+
+def load_clip_image(uri, size=CLIP_IMAGE_SIZE):
+    """Open an image file and prepare it with prepare_clip_image."""
+    with Image.open(uri) as img:
+        return prepare_clip_image(img, size)
+
+
+class DraftImageLoader:
+    """
+    Data loader for the image collection: a drop-in replacement for Chroma's
+    ImageLoader that decodes JPEGs at reduced resolution (see prepare_clip_image)
+    and returns equally sized arrays ready for batching.
+    """
+
+    def __init__(self, size=CLIP_IMAGE_SIZE, max_workers=multiprocessing.cpu_count()):
+        self.size = size
+        self._max_workers = max_workers
+
+    def _load_image(self, uri):
+        return load_clip_image(uri, self.size) if uri is not None else None
+
+    def __call__(self, uris):
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            return list(executor.map(self._load_image, uris))
@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+import threading
+import tracemalloc
+import contextvars
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+# CHATBOT_PROFILE: "cpu", "memory", "cpu,memory" or "1" (both); unset/empty disables profiling
+_MODES = {mode.strip() for mode in os.getenv("CHATBOT_PROFILE", "").lower().split(",") if mode.strip()}
+if "1" in _MODES or "true" in _MODES:
+    _MODES = {"cpu", "memory"}
+PROFILE_DIR = os.getenv("CHATBOT_PROFILE_DIR", "profiles")
+# Whether API clients may request a CPU profile of their own request (X-Profile: 1)
+ALLOW_REQUEST_PROFILING = os.getenv("CHATBOT_PROFILE_ALLOW_HEADER", "0") == "1"
+SAMPLE_INTERVAL = float(os.getenv("CHATBOT_PROFILE_INTERVAL_MS", "5")) / 1000
+TOP_ALLOCATIONS = 25
+
+# Set per request (e.g. from an X-Profile header) to profile one call without enabling it globally
+profile_requested = contextvars.ContextVar("profile_requested", default=False)
+_active = contextvars.ContextVar("profile_active", default=False)
+_DISABLED = nullcontext()
+
+
+def _output_path(name, suffix):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(PROFILE_DIR, f"{name}-{stamp}-{os.getpid()}-{threading.get_ident()}{suffix}")
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples one thread's Python stack at a fixed interval and counts identical stacks.
+
+    The counts are written in the folded format ("frame;frame;frame count")
+    understood by flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True, name="stack-sampler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def _cpu_profile(name):
+    token = _active.set(True)
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        _active.reset(token)
+        path = _output_path(name, ".folded")
+        sampler.write(path)
+        print(f"Profile of {name} ({(time.perf_counter() - start_time) * 1000:.0f} ms, "
+              f"{sum(sampler.stacks.values())} samples) written to {path}")
+
+
+def profile_section(name):
+    """
+    Sample the CPU profile of the enclosed block when profiling is enabled
+    (CHATBOT_PROFILE includes "cpu" or profile_requested is set).
+
+    Nested sections are folded into the outermost one. When profiling is off
+    this returns a shared no-op context manager.
+    """
+    if ("cpu" in _MODES or profile_requested.get()) and not _active.get():
+        return _cpu_profile(name)
+    return _DISABLED
+
+
+def profiled(name):
+    """Decorator form of profile_section."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_section(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def _allocation_trace(name):
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    try:
+        yield
+    finally:
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if started:
+            tracemalloc.stop()
+        path = _output_path(name, ".allocations.txt")
+        with open(path, 'w') as f:
+            f.write(f"{name}: current {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB\n\n")
+            f.write(f"Top {TOP_ALLOCATIONS} allocation changes by line:\n")
+            for stat in after.compare_to(before, 'lineno')[:TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+        print(f"Allocation report of {name} (peak {peak / 2**20:.1f} MiB) written to {path}")
+
+
+def trace_allocations(name):
+    """
+    Write a tracemalloc report (peak memory and top allocation changes) for the
+    enclosed block when CHATBOT_PROFILE includes "memory"; a no-op otherwise.
+    """
+    if "memory" in _MODES:
+        return _allocation_trace(name)
+    return _DISABLED
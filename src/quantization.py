@@ -0,0 +1,160 @@
+import os
+import json
+import numpy as np
+
+FLOAT16_FILE = "embeddings_f16.npy"
+PQ_CODEBOOKS_FILE = "pq_codebooks.npy"
+PQ_CODES_FILE = "pq_codes.npy"
+# Checksum of the embeddings.npy each compact index was built from
+COMPACT_SOURCE_FILE = "compact_source.json"
+
+
+def _squared_distances(x, centroids):
+    return (np.einsum('ij,ij->i', x, x)[:, None]
+            - 2.0 * x @ centroids.T
+            + np.einsum('ij,ij->i', centroids, centroids)[None, :])
+
+
+def _kmeans(x, num_centroids, iterations, rng):
+    centroids = x[rng.choice(len(x), size=num_centroids, replace=len(x) < num_centroids)].copy()
+    for _ in range(iterations):
+        assignment = np.argmin(_squared_distances(x, centroids), axis=1)
+        counts = np.bincount(assignment, minlength=num_centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, x)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Re-seed empty clusters with random points so all codes stay in use
+        if empty.any():
+            centroids[empty] = x[rng.choice(len(x), size=int(empty.sum()))]
+    return centroids
+
+
+def train_product_quantizer(vectors, num_subspaces=None, num_centroids=256,
+                            iterations=20, sample_size=20000, seed=0):
+    """
+    Train product-quantization codebooks with k-means in each subspace.
+
+    Args:
+        vectors: Array of shape (n, dim); may be memory-mapped
+        num_subspaces: Number of subspaces (must divide dim); defaults to dim // 8
+        num_centroids: Centroids per subspace (at most 256 so codes fit in uint8)
+        iterations: k-means iterations
+        sample_size: Number of vectors sampled for training
+
+    Returns:
+        Codebooks array of shape (num_subspaces, num_centroids, dim // num_subspaces)
+    """
+    dim = vectors.shape[1]
+    num_subspaces = num_subspaces or dim // 8
+    if dim % num_subspaces != 0:
+        raise ValueError(f"num_subspaces ({num_subspaces}) must divide the dimension ({dim})")
+    if num_centroids > 256:
+        raise ValueError("num_centroids must be at most 256")
+
+    rng = np.random.default_rng(seed)
+    sample_rows = np.sort(rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+    sub_dim = dim // num_subspaces
+    return np.stack([
+        _kmeans(sample[:, m * sub_dim:(m + 1) * sub_dim], num_centroids, iterations, rng)
+        for m in range(num_subspaces)
+    ]).astype(np.float32)
+
+
+def pq_encode(vectors, codebooks, block_size=65536):
+    """Encode vectors as the index of their nearest centroid in each subspace (uint8 codes)."""
+    num_subspaces, _, sub_dim = codebooks.shape
+    codes = np.empty((len(vectors), num_subspaces), dtype=np.uint8)
+    for start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+        for m in range(num_subspaces):
+            codes[start:start + len(block), m] = np.argmin(
+                _squared_distances(block[:, m * sub_dim:(m + 1) * sub_dim], codebooks[m]), axis=1
+            )
+    return codes
+
+
+def pq_tables(queries, codebooks, space="l2"):
+    """
+    Per-query lookup tables for asymmetric distance computation.
+
+    Returns:
+        Array of shape (num_queries, num_subspaces, num_centroids) holding the
+        squared distance ("l2") or inner product (otherwise) between each query
+        subvector and each centroid
+    """
+    num_subspaces, _, sub_dim = codebooks.shape
+    sub_queries = queries.reshape(len(queries), num_subspaces, sub_dim)
+    dots = np.einsum('qmd,mcd->qmc', sub_queries, codebooks)
+    if space != "l2":
+        return dots
+    return (np.einsum('qmd,qmd->qm', sub_queries, sub_queries)[:, :, None]
+            - 2.0 * dots
+            + np.einsum('mcd,mcd->mc', codebooks, codebooks)[None, :, :])
+
+
+def pq_lookup(tables, codes):
+    """Sum table entries selected by each code: returns an array of shape (num_queries, n)."""
+    num_subspaces = codes.shape[1]
+    return tables[:, np.arange(num_subspaces)[None, :], codes].sum(axis=2)
+
+
+def _compact_sources(snapshot_dir):
+    path = os.path.join(snapshot_dir, COMPACT_SOURCE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _record_compact_source(snapshot_dir, compact, source_checksum):
+    sources = _compact_sources(snapshot_dir)
+    sources[compact] = source_checksum
+    with open(os.path.join(snapshot_dir, COMPACT_SOURCE_FILE), 'w') as f:
+        json.dump(sources, f, indent=2)
+
+
+def build_compact_index(snapshot_dir, embeddings, compact, source_checksum=None, **pq_kwargs):
+    """
+    Build (or load, if already present) the compact first-pass copy of a snapshot's embeddings.
+
+    The files are memory-mapped, so worker processes opening the same snapshot
+    share them through the page cache. They are rebuilt when the snapshot's
+    embeddings change, e.g. after a re-export into the same directory.
+
+    Args:
+        snapshot_dir: Snapshot directory the files are stored in
+        embeddings: Full-precision (memory-mapped) embeddings of the snapshot
+        compact: "float16" or "pq"
+        source_checksum: Checksum of the snapshot's embeddings.npy (from its manifest)
+        pq_kwargs: Passed to train_product_quantizer
+
+    Returns:
+        float16 array for "float16", (codebooks, codes) for "pq"
+    """
+    if compact not in ("float16", "pq"):
+        raise ValueError(f"Unknown compact storage: {compact}")
+    stale = _compact_sources(snapshot_dir).get(compact) != source_checksum
+
+    if compact == "float16":
+        path = os.path.join(snapshot_dir, FLOAT16_FILE)
+        if stale or not os.path.exists(path):
+            print(f"Building float16 index for {snapshot_dir}")
+            half = np.lib.format.open_memmap(path, mode='w+', dtype=np.float16, shape=embeddings.shape)
+            for start in range(0, len(embeddings), 65536):
+                half[start:start + 65536] = embeddings[start:start + 65536]
+            half.flush()
+            del half
+            _record_compact_source(snapshot_dir, compact, source_checksum)
+        return np.load(path, mmap_mode='r')
+
+    codebooks_path = os.path.join(snapshot_dir, PQ_CODEBOOKS_FILE)
+    codes_path = os.path.join(snapshot_dir, PQ_CODES_FILE)
+    if stale or not (os.path.exists(codebooks_path) and os.path.exists(codes_path)):
+        print(f"Training product quantizer for {snapshot_dir}")
+        codebooks = train_product_quantizer(embeddings, **pq_kwargs)
+        np.save(codebooks_path, codebooks)
+        np.save(codes_path, pq_encode(embeddings, codebooks))
+        _record_compact_source(snapshot_dir, compact, source_checksum)
+    return np.load(codebooks_path), np.load(codes_path, mmap_mode='r')
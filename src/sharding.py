@@ -0,0 +1,137 @@
+import re
+import json
+import numpy as np
+
+SHARD_KEY = "sub_category"
+UNCATEGORIZED = "uncategorized"
+SHARD_SEPARATOR = "__"
+
+
+def shard_collection_name(base_name, category):
+    """Chroma-safe collection name of the shard holding one category."""
+    slug = re.sub(r'[^a-zA-Z0-9._-]+', '-', str(category)).strip('-._') or UNCATEGORIZED
+    return f"{base_name}{SHARD_SEPARATOR}{slug}"
+
+
+def shard_category(metadata):
+    """Category (shard) a record belongs to."""
+    return (metadata or {}).get(SHARD_KEY) or UNCATEGORIZED
+
+
+def _normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def category_centroid(embedding_pages):
+    """
+    Mean direction of a category's embeddings.
+
+    Args:
+        embedding_pages: Iterable of (n, dim) arrays, e.g. pages read from a shard
+
+    Returns:
+        Unit-length float32 vector, or None for an empty category
+    """
+    total, count = None, 0
+    for page in embedding_pages:
+        if len(page) == 0:
+            continue
+        page_sum = _normalize(page).sum(axis=0)
+        total = page_sum if total is None else total + page_sum
+        count += len(page)
+    if count == 0:
+        return None
+    return _normalize(total)[0]
+
+
+def encode_centroid(centroid):
+    """Centroids are kept in the shard's collection metadata, which only holds scalars."""
+    return json.dumps([round(float(x), 6) for x in centroid])
+
+
+def decode_centroid(value):
+    return np.asarray(json.loads(value), dtype=np.float32)
+
+
+class CategoryRouter:
+    """
+    Routes queries to the category shards whose centroids are closest (cosine).
+
+    A query goes to every category whose similarity is within margin of the
+    best one. The query is not routed (None), so the caller searches all
+    shards, when the router is not confident: the best similarity is below
+    min_similarity, or more than max_shards categories are that close.
+    """
+
+    def __init__(self, centroids=None, max_shards=2, margin=0.05, min_similarity=0.2):
+        """
+        Args:
+            centroids: dict of category -> centroid vector
+            max_shards: Most shards a routed query is sent to
+            margin: Similarity gap to the best category within which other
+                categories are searched too
+            min_similarity: Best-category similarity below which the query is not routed
+        """
+        self.max_shards = max_shards
+        self.margin = margin
+        self.min_similarity = min_similarity
+        self.categories = []
+        self.centroids = None
+        for category, centroid in (centroids or {}).items():
+            self.set_centroid(category, centroid)
+
+    def set_centroid(self, category, centroid):
+        centroid = _normalize(centroid)
+        if category in self.categories:
+            self.centroids[self.categories.index(category)] = centroid[0]
+            return
+        self.categories.append(category)
+        self.centroids = centroid if self.centroids is None else np.vstack([self.centroids, centroid])
+
+    def route(self, query_embeddings):
+        """
+        Args:
+            query_embeddings: Array of shape (num_queries, dim)
+
+        Returns:
+            List with, per query, the categories to search or None for a global search
+        """
+        queries = _normalize(query_embeddings)
+        if self.centroids is None:
+            return [None] * len(queries)
+        similarities = queries @ self.centroids.T
+        routes = []
+        for row in similarities:
+            close = np.flatnonzero(row >= row.max() - self.margin)
+            if row.max() < self.min_similarity or len(close) > self.max_shards:
+                routes.append(None)
+            else:
+                close = close[np.argsort(-row[close])]
+                routes.append([self.categories[i] for i in close])
+        return routes
+
+
+def categories_in_filter(where):
+    """
+    Categories a metadata filter restricts results to (sub_category $eq / $in,
+    at the top level or inside $and), or None if it does not restrict them.
+    """
+    if not where:
+        return None
+    if "$and" in where:
+        for clause in where["$and"]:
+            categories = categories_in_filter(clause)
+            if categories is not None:
+                return categories
+        return None
+    condition = where.get(SHARD_KEY)
+    if condition is None:
+        return None
+    if not isinstance(condition, dict):
+        return [condition]
+    if "$eq" in condition:
+        return [condition["$eq"]]
+    if "$in" in condition:
+        return list(condition["$in"])
+    return None
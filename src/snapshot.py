@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+RECORDS_FILE = "records.json"
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """Return the sha256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _to_columns(metadatas):
+    """Turn a list of metadata dicts into a dict of equally long columns."""
+    keys = []
+    for metadata in metadatas:
+        for key in (metadata or {}):
+            if key not in keys:
+                keys.append(key)
+    return {key: [(metadata or {}).get(key) for metadata in metadatas] for key in keys}
+
+
+def _from_columns(columns, count):
+    """Inverse of _to_columns; missing (None) values are dropped."""
+    metadatas = [{} for _ in range(count)]
+    for key, values in columns.items():
+        for metadata, value in zip(metadatas, values):
+            if value is not None:
+                metadata[key] = value
+    return metadatas
+
+
+def export_collection(collection, snapshot_dir, page_size=5000):
+    """
+    Export a collection's ids, embeddings, documents and metadata to a snapshot.
+
+    Embeddings are written to a float32 .npy file that can be memory-mapped,
+    everything else to a columnar JSON file. A manifest records the shape and
+    a checksum of every file.
+
+    Args:
+        collection: Chroma collection to export
+        snapshot_dir: Directory to write the snapshot into
+        page_size: Number of records fetched from the collection at a time
+
+    Returns:
+        dict: The snapshot manifest
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    count = collection.count()
+    embeddings_path = os.path.join(snapshot_dir, EMBEDDINGS_FILE)
+
+    ids, documents, uris, metadatas = [], [], [], []
+    embeddings = None
+    for offset in range(0, count, page_size):
+        page = collection.get(
+            include=['embeddings', 'documents', 'metadatas', 'uris'],
+            limit=page_size,
+            offset=offset
+        )
+        page_embeddings = np.asarray(page['embeddings'], dtype=np.float32)
+        if embeddings is None:
+            embeddings = np.lib.format.open_memmap(
+                embeddings_path, mode='w+', dtype=np.float32,
+                shape=(count, page_embeddings.shape[1])
+            )
+        embeddings[offset:offset + len(page_embeddings)] = page_embeddings
+        ids.extend(page['ids'])
+        documents.extend(page.get('documents') or [None] * len(page['ids']))
+        uris.extend(page.get('uris') or [None] * len(page['ids']))
+        metadatas.extend(page.get('metadatas') or [None] * len(page['ids']))
+
+    if embeddings is None:
+        embeddings = np.lib.format.open_memmap(
+            embeddings_path, mode='w+', dtype=np.float32, shape=(0, 0)
+        )
+    embeddings.flush()
+    dim = int(embeddings.shape[1])
+    del embeddings
+
+    records = {
+        "ids": ids,
+        "documents": documents if any(doc is not None for doc in documents) else None,
+        "uris": uris if any(uri is not None for uri in uris) else None,
+        "metadatas": _to_columns(metadatas),
+    }
+    records_path = os.path.join(snapshot_dir, RECORDS_FILE)
+    with open(records_path, 'w') as f:
+        json.dump(records, f)
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "collection": collection.name,
+        "collection_metadata": collection.metadata,
+        "count": len(ids),
+        "dim": dim,
+        "dtype": "float32",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "files": {
+            EMBEDDINGS_FILE: file_checksum(embeddings_path),
+            RECORDS_FILE: file_checksum(records_path),
+        },
+    }
+    with open(os.path.join(snapshot_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Exported {len(ids)} items from {collection.name} to {snapshot_dir}")
+    return manifest
+
+
+def load_snapshot(snapshot_dir, verify=True):
+    """
+    Load a snapshot written by export_collection.
+
+    Args:
+        snapshot_dir: Directory containing the snapshot
+        verify: Check file checksums against the manifest
+
+    Returns:
+        Tuple of (manifest, embeddings, records) where embeddings is a
+        read-only memory-mapped float32 array
+    """
+    with open(os.path.join(snapshot_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version: {manifest.get('format_version')}")
+
+    if verify:
+        for file_name, checksum in manifest["files"].items():
+            if file_checksum(os.path.join(snapshot_dir, file_name)) != checksum:
+                raise ValueError(f"Checksum mismatch for {file_name} in {snapshot_dir}")
+
+    embeddings = np.load(os.path.join(snapshot_dir, EMBEDDINGS_FILE), mmap_mode='r')
+    with open(os.path.join(snapshot_dir, RECORDS_FILE)) as f:
+        records = json.load(f)
+    if embeddings.shape[0] != manifest["count"] or len(records["ids"]) != manifest["count"]:
+        raise ValueError(f"Snapshot {snapshot_dir} does not match its manifest count")
+    records["metadatas"] = _from_columns(records["metadatas"], manifest["count"])
+    return manifest, embeddings, records
+
+
+def import_collection(collection, snapshot_dir, batch_size=5000, verify=True):
+    """
+    Bulk-import a snapshot into a collection without calling its embedding function.
+
+    Args:
+        collection: Chroma collection to import into (expected to be empty)
+        snapshot_dir: Directory containing the snapshot
+        batch_size: Number of records added per call
+        verify: Check file checksums before importing
+
+    Returns:
+        int: Number of records imported
+    """
+    if collection.count() > 0:
+        raise ValueError(f"Collection {collection.name} is not empty; import expects a fresh collection")
+
+    manifest, embeddings, records = load_snapshot(snapshot_dir, verify=verify)
+    ids = records["ids"]
+    documents = records["documents"]
+    uris = records["uris"]
+    metadatas = records["metadatas"]
+
+    for i in range(0, len(ids), batch_size):
+        batch = {
+            "ids": ids[i:i + batch_size],
+            "embeddings": np.asarray(embeddings[i:i + batch_size]),
+        }
+        if any(metadatas):
+            batch["metadatas"] = metadatas[i:i + batch_size]
+        if documents is not None:
+            batch["documents"] = documents[i:i + batch_size]
+        if uris is not None:
+            batch["uris"] = uris[i:i + batch_size]
+        collection.add(**batch)
+        print(f"Imported batch #{i//batch_size + 1}: {len(batch['ids'])} items")
+    return len(ids)
@@ -1,10 +1,25 @@
 import os
 import logging
+from src.image_loader import CLIP_IMAGE_SIZE, prepare_clip_image
 
 def setup_logging():
     """Configure logging settings"""
     logging.basicConfig(level=logging.ERROR)
 
+def format_product_text(product):
+    """
+    Text of a product as embedded in the text collection and shown to the LLM.
+
+    Args:
+        product: Dictionary or Series containing product information
+    """
+    return f"""
+    Product: {product.get('name', '')}
+    Category: {product.get('sub_category', '')}
+    Rating: {product.get('ratings', '')} ({product.get('no_of_ratings', '')} ratings)
+    Price: ${product.get('discount_price', '')} (Original: ${product.get('actual_price', '')})
+    """
+
 def create_product_document(product, image_folder_path):
     """
     Create a document from product metadata.
@@ -31,20 +46,32 @@ def create_product_document(product, image_folder_path):
     if not image_file_name in image_uris:
         return None, None, None, None
     
-    product_text = f"""
-    Product: {name}
-    Category: {sub_category}
-    Rating: {ratings} ({no_of_ratings} ratings)
-    Price: ${discount_price} (Original: ${actual_price})
-    """
-    
     image_uri = os.path.join(image_folder_path, image_file_name)
     metadata = {
         "product_id": product_id,
         "name": name,
         "sub_category": sub_category,
         "ratings": ratings,
+        "no_of_ratings": no_of_ratings,
         "discount_price": discount_price,
+        "actual_price": actual_price,
         "uri": image_uri
     }    
-    return product_text, metadata, product_id, image_uri 
\ No newline at end of file
+    product_text = format_product_text(metadata)
+    return product_text, metadata, product_id, image_uri
+
+def prepare_uploaded_image(image, size=CLIP_IMAGE_SIZE):
+    """
+    Convert an uploaded image to a CLIP-ready RGB numpy array in memory.
+
+    Uploaded JPEGs that are not decoded yet are decoded at reduced resolution,
+    the same way product images are at ingest (see src/image_loader.py).
+
+    Args:
+        image: PIL image
+        size: Side length of the square output
+
+    Returns:
+        numpy array of shape (size, size, 3)
+    """
+    return prepare_clip_image(image, size)
@@ -0,0 +1,549 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.snapshot import EMBEDDINGS_FILE, load_snapshot
+from src.quantization import build_compact_index, pq_tables, pq_lookup
+from src.sharding import (CategoryRouter, categories_in_filter, category_centroid, decode_centroid,
+                          encode_centroid, shard_category)
+
+try:
+    from httpx import ConnectError, ConnectTimeout, TransportError
+    RETRYABLE_ERRORS = (ConnectionError, TimeoutError, TransportError)
+    # Errors raised before a request reached the server, so even writes can be retried
+    UNSENT_ERRORS = (ConnectionRefusedError, ConnectError, ConnectTimeout)
+except ImportError:
+    RETRYABLE_ERRORS = (ConnectionError, TimeoutError)
+    UNSENT_ERRORS = (ConnectionRefusedError,)
+
+QUERY_INCLUDE = ['documents', 'distances', 'metadatas', 'uris']
+# Chroma's SQLite backend rejects a get with more than ~32k ids (SQL variable limit)
+GET_IDS_CHUNK_SIZE = 5000
+
+
+class VectorStore:
+    """
+    Minimal vector store interface shared by DatabaseManager and ELectronicsChatbot.
+
+    Results use Chroma's shape (one list per query under 'ids', 'distances',
+    'metadatas', ...) so backends are interchangeable.
+    """
+    name = None
+
+    def count(self):
+        raise NotImplementedError
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None, uris=None):
+        raise NotImplementedError(f"{type(self).__name__} is read-only")
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=['metadatas', 'documents']):
+        raise NotImplementedError
+
+    def query(self, query_texts=None, query_images=None, query_embeddings=None,
+              n_results=10, where=None, include=QUERY_INCLUDE):
+        raise NotImplementedError
+
+    def embed(self, texts=None, images=None):
+        """Embed texts or images with the store's embedding function."""
+        inputs = texts if texts is not None else images
+        return np.asarray(self.embedding_function(list(inputs)), dtype=np.float32)
+
+
+class ChromaVectorStore(VectorStore):
+    """
+    VectorStore backed by a Chroma collection.
+
+    Calls can be bounded by a timeout and retried with exponential backoff.
+    Reads are retried on connection errors and timeouts; writes only when the
+    request never reached the server. A timed-out call is abandoned, not
+    killed: it finishes in the background on a worker thread, so retrying a
+    timed-out write could apply it twice.
+    """
+    _timeout_executor = ThreadPoolExecutor(thread_name_prefix="chroma")
+
+    def __init__(self, collection, embedding_function, data_loader=None,
+                 timeout=None, retries=0, retry_backoff=0.2):
+        self.collection = collection
+        self.embedding_function = embedding_function
+        self.data_loader = data_loader
+        self.name = collection.name
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+
+    def _call(self, method, write=False, **kwargs):
+        retryable = UNSENT_ERRORS if write else RETRYABLE_ERRORS
+        for attempt in range(self.retries + 1):
+            try:
+                if self.timeout is None:
+                    return method(**kwargs)
+                return ChromaVectorStore._timeout_executor.submit(method, **kwargs).result(timeout=self.timeout)
+            except retryable as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                print(f"{self.name}: {method.__name__} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def count(self):
+        return self._call(self.collection.count)
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None, uris=None):
+        self._call(self.collection.add, write=True, ids=ids, embeddings=embeddings, documents=documents,
+                   metadatas=metadatas, uris=uris)
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None, uris=None):
+        self._call(self.collection.upsert, write=True, ids=ids, embeddings=embeddings, documents=documents,
+                   metadatas=metadatas, uris=uris)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=['metadatas', 'documents']):
+        if ids is None or len(ids) <= GET_IDS_CHUNK_SIZE:
+            return self._call(self.collection.get, ids=ids, where=where, limit=limit, offset=offset,
+                              include=include)
+        # Look long id lists up in chunks, then apply offset and limit to the combined results
+        ids = list(ids)
+        results = {key: [] for key in ['ids'] + list(include)}
+        for start in range(0, len(ids), GET_IDS_CHUNK_SIZE):
+            page = self._call(self.collection.get, ids=ids[start:start + GET_IDS_CHUNK_SIZE],
+                              where=where, include=include)
+            for key, values in results.items():
+                values.extend(page[key] if page[key] is not None else [None] * len(page['ids']))
+        offset = offset or 0
+        end = None if limit is None else offset + limit
+        results = {key: values[offset:end] for key, values in results.items()}
+        if 'embeddings' in results:
+            results['embeddings'] = np.asarray(results['embeddings'])
+        return results
+
+    def query(self, query_texts=None, query_images=None, query_embeddings=None,
+              n_results=10, where=None, include=QUERY_INCLUDE):
+        return self._call(
+            self.collection.query,
+            query_texts=query_texts,
+            query_images=query_images,
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=include
+        )
+
+    def modify(self, metadata):
+        self._call(self.collection.modify, write=True, metadata=metadata)
+
+    @property
+    def metadata(self):
+        return self.collection.metadata
+
+
+class MemmapVectorStore(VectorStore):
+    """
+    Read-only in-process VectorStore over a memory-mapped float32 matrix.
+
+    Search is exact brute force with vectorized NumPy scoring; metadata,
+    documents and uris are kept in a side table indexed by row. Because the
+    matrix is memory-mapped, worker processes opening the same snapshot share
+    its pages through the OS page cache.
+
+    With compact="float16" or compact="pq" the first pass scans a compact
+    copy (half precision, or product-quantization codes), memory-mapped from
+    files next to the snapshot so processes share it too, and only a
+    shortlist of rescore_factor * n_results rows is re-scored exactly against
+    the full-precision matrix, so most of it never has to be resident.
+    """
+
+    def __init__(self, name, embeddings, ids, embedding_function, metadatas=None,
+                 documents=None, uris=None, space="l2", block_size=65536,
+                 compact=None, compact_index=None, rescore_factor=10):
+        if space not in ("l2", "cosine", "ip"):
+            raise ValueError(f"Unsupported space: {space}")
+        if compact not in (None, "float16", "pq"):
+            raise ValueError(f"Unsupported compact storage: {compact}")
+        self.compact = compact
+        self.compact_index = compact_index
+        self.rescore_factor = rescore_factor
+        self.name = name
+        self.embeddings = embeddings
+        self.ids = list(ids)
+        self.metadatas = metadatas or [{} for _ in self.ids]
+        self.documents = documents
+        self.uris = uris
+        self.embedding_function = embedding_function
+        self.space = space
+        self.block_size = block_size
+        self._row_by_id = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self._columns = {}
+
+        # Per-row norms are small enough to keep in RAM and make l2/cosine a single matmul
+        self._sq_norms = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), block_size):
+            block = np.asarray(embeddings[start:start + block_size], dtype=np.float32)
+            self._sq_norms[start:start + len(block)] = np.einsum('ij,ij->i', block, block)
+
+    @classmethod
+    def from_snapshot(cls, snapshot_dir, embedding_function, space=None, verify=False,
+                      compact=None, pq_kwargs=None, **kwargs):
+        """
+        Open a snapshot written by export_collection.
+
+        Args:
+            snapshot_dir: Directory containing the snapshot
+            embedding_function: Function used to embed query texts/images
+            space: Distance space; defaults to the source collection's 'hnsw:space' or l2
+            verify: Check file checksums before opening
+            compact: None, "float16" or "pq"; the compact index is built and
+                saved next to the snapshot on first use
+            pq_kwargs: Passed to train_product_quantizer when building a "pq" index
+        """
+        manifest, embeddings, records = load_snapshot(snapshot_dir, verify=verify)
+        if space is None:
+            space = (manifest.get("collection_metadata") or {}).get("hnsw:space", "l2")
+        compact_index = None
+        if compact is not None:
+            compact_index = build_compact_index(snapshot_dir, embeddings, compact,
+                                                source_checksum=manifest["files"][EMBEDDINGS_FILE],
+                                                **(pq_kwargs or {}))
+        return cls(
+            manifest["collection"], embeddings, records["ids"], embedding_function,
+            metadatas=records["metadatas"], documents=records["documents"],
+            uris=records["uris"], space=space, compact=compact,
+            compact_index=compact_index, **kwargs
+        )
+
+    @property
+    def metadata(self):
+        return {"source": self.name, "hnsw:space": self.space}
+
+    def count(self):
+        return len(self.ids)
+
+    def _column(self, key):
+        if key not in self._columns:
+            self._columns[key] = np.array([meta.get(key) for meta in self.metadatas], dtype=object)
+        return self._columns[key]
+
+    def _where_mask(self, where):
+        """Evaluate a Chroma-style metadata filter ($eq, $ne, $in, $nin, $and, $or) to a row mask."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+                continue
+            if key == "$or":
+                any_mask = np.zeros(len(self.ids), dtype=bool)
+                for clause in condition:
+                    any_mask |= self._where_mask(clause)
+                mask &= any_mask
+                continue
+            column = self._column(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, value in condition.items():
+                if op == "$eq":
+                    mask &= column == value
+                elif op == "$ne":
+                    mask &= column != value
+                elif op == "$in":
+                    mask &= np.isin(column, list(value))
+                elif op == "$nin":
+                    mask &= ~np.isin(column, list(value))
+                else:
+                    raise ValueError(f"Unsupported where operator: {op}")
+        return mask
+
+    def _distances(self, queries, block, sq_norms):
+        scores = block @ queries.T
+        if self.space == "ip":
+            return 1.0 - scores.T
+        if self.space == "cosine":
+            q_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            denom = q_norms * np.sqrt(np.maximum(sq_norms, 1e-12))[None, :]
+            return 1.0 - scores.T / np.maximum(denom, 1e-12)
+        q_sq = np.einsum('ij,ij->i', queries, queries)[:, None]
+        return q_sq + sq_norms[None, :] - 2.0 * scores.T
+
+    def _pq_distances(self, tables, codes, sq_norms, q_norms):
+        scores = pq_lookup(tables, codes)
+        if self.space == "l2":
+            return scores
+        if self.space == "ip":
+            return 1.0 - scores
+        denom = q_norms * np.sqrt(np.maximum(sq_norms, 1e-12))[None, :]
+        return 1.0 - scores / np.maximum(denom, 1e-12)
+
+    def _block_distances(self, queries, rows, start, contiguous, tables=None):
+        sq_norms = self._sq_norms[rows]
+        if self.compact == "pq":
+            codes = self.compact_index[1]
+            codes = codes[start:start + len(rows)] if contiguous else codes[rows]
+            return self._pq_distances(tables, codes, sq_norms, np.linalg.norm(queries, axis=1, keepdims=True))
+        source = self.compact_index if self.compact == "float16" else self.embeddings
+        block = source[start:start + len(rows)] if contiguous else source[rows]
+        return self._distances(queries, np.asarray(block, dtype=np.float32), sq_norms)
+
+    def _scan(self, queries, k, candidate_rows):
+        """Blockwise top-k over all (or the candidate) rows using the first-pass representation."""
+        total = len(self.ids) if candidate_rows is None else len(candidate_rows)
+        tables = pq_tables(queries, self.compact_index[0], self.space) if self.compact == "pq" else None
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_dists = np.empty((len(queries), 0), dtype=np.float32)
+
+        for start in range(0, total, self.block_size):
+            if candidate_rows is None:
+                rows = np.arange(start, min(start + self.block_size, total))
+            else:
+                rows = candidate_rows[start:start + self.block_size]
+            dists = self._block_distances(queries, rows, start, candidate_rows is None, tables)
+            if dists.shape[1] > k:
+                top = np.argpartition(dists, k - 1, axis=1)[:, :k]
+                dists = np.take_along_axis(dists, top, axis=1)
+                rows = rows[top]
+            else:
+                rows = np.broadcast_to(rows, dists.shape)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            best_dists = np.concatenate([best_dists, dists], axis=1)
+            if best_rows.shape[1] > k:
+                top = np.argpartition(best_dists, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+                best_dists = np.take_along_axis(best_dists, top, axis=1)
+        return best_rows, best_dists
+
+    def _rescore(self, queries, shortlist, k):
+        """Exact distances for each query's shortlisted rows, read from the full-precision matrix."""
+        best_rows, best_dists = [], []
+        for query, rows in zip(queries, shortlist):
+            rows = np.sort(rows)
+            dists = self._distances(query[None, :], np.asarray(self.embeddings[rows], dtype=np.float32),
+                                    self._sq_norms[rows])[0]
+            top = np.argpartition(dists, k - 1)[:k] if len(dists) > k else np.arange(len(dists))
+            best_rows.append(rows[top])
+            best_dists.append(dists[top])
+        return np.array(best_rows), np.array(best_dists)
+
+    def search(self, query_embeddings, n_results=10, where=None):
+        """
+        Top-k search: exact, or compact first pass plus exact re-scoring.
+
+        Args:
+            query_embeddings: Array of shape (num_queries, dim)
+            n_results: Number of neighbours per query
+            where: Optional metadata filter
+
+        Returns:
+            Tuple of (rows, distances) arrays of shape (num_queries, k)
+        """
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        candidate_rows = np.flatnonzero(self._where_mask(where)) if where else None
+        total = len(self.ids) if candidate_rows is None else len(candidate_rows)
+        k = min(n_results, total)
+        if k == 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+
+        if self.compact is None:
+            best_rows, best_dists = self._scan(queries, k, candidate_rows)
+        else:
+            shortlist, _ = self._scan(queries, min(total, k * self.rescore_factor), candidate_rows)
+            best_rows, best_dists = self._rescore(queries, shortlist, k)
+
+        order = np.argsort(best_dists, axis=1, kind='stable')
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_dists, order, axis=1)
+
+    def _records(self, rows, include):
+        result = {"ids": [self.ids[row] for row in rows]}
+        if 'metadatas' in include:
+            result['metadatas'] = [self.metadatas[row] for row in rows]
+        if 'documents' in include:
+            result['documents'] = [self.documents[row] for row in rows] if self.documents else [None] * len(rows)
+        if 'uris' in include:
+            result['uris'] = [self.uris[row] for row in rows] if self.uris else [None] * len(rows)
+        if 'embeddings' in include:
+            result['embeddings'] = np.asarray(self.embeddings[np.asarray(rows, dtype=np.int64)])
+        return result
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=['metadatas', 'documents']):
+        if ids is not None:
+            rows = [self._row_by_id[doc_id] for doc_id in ids if doc_id in self._row_by_id]
+        else:
+            rows = np.arange(len(self.ids))
+        if where:
+            mask = self._where_mask(where)
+            rows = [row for row in rows if mask[row]]
+        offset = offset or 0
+        rows = list(rows[offset:offset + limit] if limit is not None else rows[offset:])
+        return self._records(rows, include)
+
+    def query(self, query_texts=None, query_images=None, query_embeddings=None,
+              n_results=10, where=None, include=QUERY_INCLUDE):
+        if query_embeddings is None:
+            query_embeddings = self.embed(texts=query_texts, images=query_images)
+        rows, dists = self.search(query_embeddings, n_results=n_results, where=where)
+
+        results = {"ids": [], "distances": [], "metadatas": [], "documents": [],
+                   "uris": [], "embeddings": [], "data": None}
+        for query_rows, query_dists in zip(rows, dists):
+            records = self._records(list(query_rows), include)
+            for key, value in records.items():
+                results[key].append(value)
+            results["distances"].append(query_dists.tolist())
+        for key in ("metadatas", "documents", "uris", "embeddings", "distances"):
+            if key not in include:
+                results[key] = None
+        return results
+
+
+class ShardedVectorStore(VectorStore):
+    """
+    VectorStore split into one store per category (sub_category metadata).
+
+    Records are added to the shard of their category. Queries are embedded
+    once, routed by a CategoryRouter to the nearest category shard(s), and the
+    shards' hits are merged by distance; queries the router is not confident
+    about are sent to every shard, and filters on sub_category select shards directly.
+    Routed queries therefore cost a search over one or a few shards rather
+    than the whole catalog.
+
+    Category centroids are stored in each shard's collection metadata and are
+    recomputed by update_router() after ingest.
+    """
+
+    def __init__(self, name, shards, shard_factory, embedding_function, data_loader=None,
+                 max_shards=2, margin=0.05, min_similarity=0.2, page_size=5000):
+        """
+        Args:
+            name: Base collection name
+            shards: dict of category -> ChromaVectorStore
+            shard_factory: Callable creating the store for a new category
+            embedding_function: Function used to embed query texts/images
+            data_loader: Image loader of the shards (image collection only)
+            max_shards, margin, min_similarity: Routing parameters, see CategoryRouter
+            page_size: Records read at a time when recomputing centroids
+        """
+        self.name = name
+        self.shards = dict(shards)
+        self.shard_factory = shard_factory
+        self.embedding_function = embedding_function
+        self.data_loader = data_loader
+        self.page_size = page_size
+        self.router = CategoryRouter(max_shards=max_shards, margin=margin, min_similarity=min_similarity)
+        self._stale = set()
+        for category, shard in self.shards.items():
+            centroid = (shard.metadata or {}).get("centroid")
+            if centroid:
+                self.router.set_centroid(category, decode_centroid(centroid))
+            else:
+                self._stale.add(category)
+
+    @property
+    def metadata(self):
+        shard = next(iter(self.shards.values()), None)
+        metadata = dict(shard.metadata or {}) if shard is not None else {}
+        metadata.pop("centroid", None)
+        metadata.pop("category", None)
+        metadata["source"] = self.name
+        return metadata
+
+    def count(self):
+        return sum(shard.count() for shard in self.shards.values())
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None, uris=None):
+        rows_by_category = {}
+        for row, metadata in enumerate(metadatas or [None] * len(ids)):
+            rows_by_category.setdefault(shard_category(metadata), []).append(row)
+
+        def pick(values, rows):
+            if values is None:
+                return None
+            if isinstance(values, np.ndarray):
+                return values[rows]
+            return [values[row] for row in rows]
+
+        for category, rows in rows_by_category.items():
+            if category not in self.shards:
+                self.shards[category] = self.shard_factory(category)
+            self.shards[category].add(
+                ids=pick(ids, rows), embeddings=pick(embeddings, rows), documents=pick(documents, rows),
+                metadatas=pick(metadatas, rows), uris=pick(uris, rows)
+            )
+            self._stale.add(category)
+
+    def update_router(self):
+        """Recompute and store the centroids of the shards added to since the last update."""
+        for category in sorted(self._stale):
+            shard = self.shards[category]
+            pages = (np.asarray(shard.get(include=['embeddings'], limit=self.page_size, offset=offset)['embeddings'])
+                     for offset in range(0, shard.count(), self.page_size))
+            centroid = category_centroid(pages)
+            if centroid is None:
+                continue
+            shard.modify(metadata={**(shard.metadata or {}), "category": category,
+                                   "centroid": encode_centroid(centroid)})
+            self.router.set_centroid(category, centroid)
+        print(f"{self.name}: routing over {len(self.router.categories)} category shards")
+        self._stale.clear()
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=['metadatas', 'documents']):
+        results = {key: [] for key in ['ids'] + list(include)}
+        offset = offset or 0
+        if ids is None and where is None:
+            # Page across shards in order without reading the ones before the offset
+            for shard in self.shards.values():
+                remaining = None if limit is None else limit - len(results['ids'])
+                if remaining == 0:
+                    break
+                size = shard.count()
+                if offset >= size:
+                    offset -= size
+                    continue
+                self._extend(results, shard.get(include=include, limit=remaining, offset=offset))
+                offset = 0
+        else:
+            for shard in self._shards_for(categories_in_filter(where)):
+                self._extend(results, shard.get(ids=ids, where=where, include=include))
+            end = None if limit is None else offset + limit
+            results = {key: values[offset:end] for key, values in results.items()}
+        if 'embeddings' in results:
+            results['embeddings'] = np.asarray(results['embeddings'])
+        return results
+
+    def _extend(self, results, page):
+        for key, values in results.items():
+            page_values = page.get(key)
+            values.extend(list(page_values) if page_values is not None else [None] * len(page['ids']))
+
+    def _shards_for(self, categories):
+        if categories is None:
+            return list(self.shards.values())
+        return [self.shards[category] for category in categories if category in self.shards]
+
+    def query(self, query_texts=None, query_images=None, query_embeddings=None,
+              n_results=10, where=None, include=QUERY_INCLUDE):
+        if query_embeddings is None:
+            query_embeddings = self.embed(texts=query_texts, images=query_images)
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        filtered = categories_in_filter(where)
+        routes = [filtered] * len(query_embeddings) if filtered is not None else self.router.route(query_embeddings)
+
+        # Queries with the same route are searched together, one call per shard
+        groups = {}
+        for i, route in enumerate(routes):
+            groups.setdefault(None if route is None else tuple(route), []).append(i)
+        hits = [[] for _ in routes]
+        shard_include = list(include) if 'distances' in include else list(include) + ['distances']
+        for route, rows in groups.items():
+            for shard in self._shards_for(None if route is None else list(route)):
+                results = shard.query(query_embeddings=query_embeddings[rows].tolist(), n_results=n_results,
+                                      where=where, include=shard_include)
+                for j, row in enumerate(rows):
+                    for k, distance in enumerate(results['distances'][j]):
+                        hits[row].append((distance, results, j, k))
+
+        merged = {"ids": [], "distances": [], "metadatas": [], "documents": [],
+                  "uris": [], "embeddings": [], "data": None}
+        for query_hits in hits:
+            best = sorted(query_hits, key=lambda hit: hit[0])[:n_results]
+            for key in ("ids", "distances", "metadatas", "documents", "uris", "embeddings"):
+                merged[key].append([results[key][j][k] if results.get(key) is not None else None
+                                    for _, results, j, k in best])
+        for key in ("metadatas", "documents", "uris", "embeddings", "distances"):
+            if key not in include:
+                merged[key] = None
+        return merged
@@ -0,0 +1,208 @@
+import io
+import os
+import sys
+import json
+import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Annotated, List, Optional
+from dotenv import load_dotenv
+from PIL import Image
+from pydantic import BaseModel, Field, StringConstraints
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import Response, StreamingResponse
+import uvicorn
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+load_dotenv()
+
+from src.chatbot_factory import initialize_chatbot
+from src.utils import prepare_uploaded_image
+from src.profiling import ALLOW_REQUEST_PROFILING, profile_requested, profile_section
+
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+THUMBNAIL_SIZE = (200, 200)
+# Most questions of one /batch request answered at the same time
+MAX_BATCH_ANSWER_WORKERS = 16
+# Most results a request may ask for per collection
+MAX_RESULTS = 50
+
+
+# Questions must contain a non-whitespace character
+Question = Annotated[str, StringConstraints(pattern=r"\S")]
+MaxResults = Annotated[int, Field(ge=1, le=MAX_RESULTS)]
+
+
+class QueryRequest(BaseModel):
+    question: Question
+    max_results: MaxResults = 5
+    stream: bool = False
+
+
+class RetrieveRequest(BaseModel):
+    question: Question
+    max_results: MaxResults = 5
+
+
+class BatchRequest(BaseModel):
+    questions: List[Question]
+    max_results: MaxResults = 5
+    answer: bool = False
+
+
+
+def format_hits(results):
+    """Compact JSON hits (product id, distance, metadata, thumbnail url) for one query's results"""
+    if results is None:
+        return []
+    hits = []
+    for doc_id, distance, metadata in zip(results['ids'][0], results['distances'][0], results['metadatas'][0]):
+        product_id = (metadata or {}).get('product_id', doc_id)
+        hits.append({
+            "product_id": product_id,
+            "distance": float(distance),
+            "metadata": metadata,
+            "thumbnail_url": f"/thumbnails/{product_id}.jpg",
+        })
+    return hits
+
+
+def format_retrieved(retrieved):
+    return {"text_results": format_hits(retrieved["text"]), "image_results": format_hits(retrieved["image"])}
+
+
+def result_metadatas(results):
+    """Metadata of the hits in format_retrieved output, image results first"""
+    return [hit["metadata"] for hit in results["image_results"] + results["text_results"]]
+
+
+def create_api_app(chatbot_instance):
+    """Create the JSON HTTP API around a pre-initialized chatbot"""
+    app = FastAPI(title="Electronics Product Assistant API")
+
+    if ALLOW_REQUEST_PROFILING:
+        @app.middleware("http")
+        async def profile_header(request, call_next):
+            token = profile_requested.set(request.headers.get("x-profile") == "1")
+            try:
+                return await call_next(request)
+            finally:
+                profile_requested.reset(token)
+
+    def answer_response(question, retrieved, stream, start_time):
+        inputs = chatbot_instance.format_retrieved_inputs(question, retrieved)
+        results = format_retrieved(retrieved)
+        metadatas = result_metadatas(results)
+        if not stream:
+            with profile_section("api_answer"):
+                answer, degraded = chatbot_instance.generate_answer(inputs, metadatas, start_time)
+            return {"answer": answer, "degraded": degraded, **results,
+                    "took_ms": (time.perf_counter() - start_time) * 1000}
+
+        def events():
+            # One JSON object per line: the retrieval results, then answer chunks as they arrive.
+            # If the answer misses the deadline, the retrieval-only answer follows as a "degraded" event
+            yield json.dumps({"type": "results", **results}) + "\n"
+            degraded = False
+            for text, degraded in chatbot_instance.stream_answer(inputs, metadatas, start_time):
+                yield json.dumps({"type": "degraded" if degraded else "answer", "text": text}) + "\n"
+            yield json.dumps({"type": "done", "degraded": degraded,
+                              "took_ms": (time.perf_counter() - start_time) * 1000}) + "\n"
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+    @app.post("/query")
+    def query(request: QueryRequest):
+        start_time = time.perf_counter()
+        # Only retrieval is profiled here: a streamed answer is generated after this returns
+        with profile_section("api_query"):
+            retrieved = chatbot_instance.retrieve(request.question, max_results=request.max_results)
+        return answer_response(request.question, retrieved, request.stream, start_time)
+
+    @app.post("/query_image")
+    def query_image(file: UploadFile = File(...), question: Optional[str] = Form(None),
+                    max_results: int = Form(5, ge=1, le=MAX_RESULTS), stream: bool = Form(False)):
+        start_time = time.perf_counter()
+        data = file.file.read(MAX_UPLOAD_BYTES + 1)
+        if len(data) > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Image too large")
+        try:
+            image_npy = prepare_uploaded_image(Image.open(io.BytesIO(data)))
+        except Exception:
+            raise HTTPException(status_code=400, detail="Could not decode image")
+        with profile_section("api_query_image"):
+            retrieved = chatbot_instance.retrieve(question, image_npy=image_npy, max_results=max_results)
+        return answer_response(question or "Find products similar to this image", retrieved, stream, start_time)
+
+    @app.post("/retrieve")
+    def retrieve(request: RetrieveRequest):
+        start_time = time.perf_counter()
+        with profile_section("api_retrieve"):
+            retrieved = chatbot_instance.retrieve(request.question, max_results=request.max_results)
+        return {**format_retrieved(retrieved), "took_ms": (time.perf_counter() - start_time) * 1000}
+
+    @app.post("/batch")
+    def batch(request: BatchRequest):
+        start_time = time.perf_counter()
+        if not request.questions:
+            return {"results": [], "took_ms": 0.0}
+        with profile_section("api_batch"):
+            retrieved = chatbot_instance.retrieve_batch(request.questions, max_results=request.max_results)
+        results = [format_retrieved(item) for item in retrieved]
+        if request.answer:
+            # Each question gets its own deadline handling, so a failed or stalled
+            # answer degrades only that question's result
+            def answer(question, item, result):
+                inputs = chatbot_instance.format_retrieved_inputs(question, item)
+                return chatbot_instance.generate_answer(inputs, result_metadatas(result), start_time)
+
+            with ThreadPoolExecutor(max_workers=min(len(results), MAX_BATCH_ANSWER_WORKERS)) as executor:
+                answers = list(executor.map(answer, request.questions, retrieved, results))
+            for result, (answer_text, degraded) in zip(results, answers):
+                result["answer"] = answer_text
+                result["degraded"] = degraded
+        return {"results": results, "took_ms": (time.perf_counter() - start_time) * 1000}
+
+    @lru_cache(maxsize=4096)
+    def thumbnail_bytes(product_id):
+        results = chatbot_instance.image_collection.get(ids=[product_id], include=['uris'])
+        if not results['ids'] or not results['uris'][0]:
+            return None
+        with Image.open(results['uris'][0]) as img:
+            img.draft('RGB', THUMBNAIL_SIZE)
+            img = img.convert('RGB')
+            img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG', quality=85)
+        return buffer.getvalue()
+
+    @app.get("/thumbnails/{product_id}.jpg")
+    def thumbnail(product_id: str):
+        data = thumbnail_bytes(product_id)
+        if data is None:
+            raise HTTPException(status_code=404, detail="Unknown product")
+        return Response(content=data, media_type="image/jpeg",
+                        headers={"Cache-Control": "public, max-age=86400"})
+
+    return app
+
+
+def main():
+    """Run the HTTP API server"""
+    print("Initializing chatbot and databases...")
+    chatbot_instance = initialize_chatbot()
+    app = create_api_app(chatbot_instance)
+
+    print("Starting API server...")
+    uvicorn.run(
+        app,
+        host=os.getenv("API_HOST", "127.0.0.1"),
+        port=int(os.getenv("API_PORT", "8080")),
+        timeout_keep_alive=int(os.getenv("API_KEEPALIVE_SECS", "30")),
+    )
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,6 @@ import pandas as pd
 import os
 from PIL import Image
 from dotenv import load_dotenv
-import numpy as np
 import sys
 from pathlib import Path
 
@@ -14,27 +13,24 @@ sys.path.append(str(project_root))
 load_dotenv()
 
 # Now the imports should work
-from src.chatbot import ELectronicsChatbot
-from src.db_manager import DatabaseManager
+from src.chatbot_factory import initialize_chatbot, get_shared_chatbot
+from src.utils import prepare_uploaded_image
+from src.profiling import profiled
 from ui.components import create_image_sources, create_text_sources, create_results_table
 
-def initialize_chatbot():
-    """Initialize the chatbot with database connections"""
-    db_manager = DatabaseManager()
-    return ELectronicsChatbot(db_manager.text_collection, db_manager.image_collection)
-
-def process_query(message, history, image=None):
+@profiled("chat_turn")
+def process_query(message, history, image=None, chatbot_instance=None):
     """Process the user query and return the chatbot response"""
-    chatbot_instance = initialize_chatbot()
+    if image is not None and not message:
+        return process_image_search(image, history, chatbot_instance)
+
+    chatbot_instance = chatbot_instance or get_shared_chatbot()
     
     if image is not None:
-        os.makedirs("data/images/user_uploads", exist_ok=True)
-        image_path = os.path.join("data/images/user_uploads", "user_uploaded.jpg")
-        image.save(image_path)
-        if not message:
-            message = "Find products similar to this image"
-    
-    response = chatbot_instance.query(message)
+        # Fuse the question with the uploaded image in a single image-collection search
+        response = chatbot_instance.query_multimodal(message, prepare_uploaded_image(image))
+    else:
+        response = chatbot_instance.query(message)
     answer_text = response["answer"]
     
     # Get image URIs and metadata
@@ -57,13 +53,14 @@ def process_query(message, history, image=None):
     return prepare_outputs(history, text_product_images, text_captions, 
                          product_images, captions, results_df)
 
-def process_image_search(image, history):
+@profiled("image_search")
+def process_image_search(image, history, chatbot_instance=None):
     """Process image search request"""
     if image is None:
         return create_empty_outputs()
     
-    chatbot_instance = initialize_chatbot()
-    image_npy = np.array(image)
+    chatbot_instance = chatbot_instance or get_shared_chatbot()
+    image_npy = prepare_uploaded_image(image)
     response = chatbot_instance.query_image(image_npy)
     answer_text = response["answer"]
     
@@ -218,52 +215,10 @@ def create_gradio_app(chatbot_instance):
         
         # Update event handlers to use the passed chatbot_instance
         def process_query_with_chatbot(message, history, image=None):
-            if image is not None:
-                os.makedirs("data/images/user_uploads", exist_ok=True)
-                image_path = os.path.join("data/images/user_uploads", "user_uploaded.jpg")
-                image.save(image_path)
-                if not message:
-                    message = "Find products similar to this image"
-            
-            response = chatbot_instance.query(message)
-            answer_text = response["answer"]
-            
-            # Rest of the processing remains the same
-            image_uris = response.get("image_uris", [])[:5]
-            image_metadatas = response.get("image_metadatas", [])[:5]
-            text_uris = response.get("text_uris", [])[:5]
-            text_content = response.get("text_content", [])[:5]
-            text_metadatas = response.get("text_metadatas", [])[:5]
-
-            product_images, captions = process_images(image_uris, image_metadatas)
-            text_product_images, text_captions = process_images(text_uris, text_metadatas, size=(200, 200))
-            
-            results_df = create_results_dataframe(text_metadatas, image_metadatas)
-            
-            history.append((message, answer_text))
-            
-            return prepare_outputs(history, text_product_images, text_captions, 
-                                product_images, captions, results_df)
+            return process_query(message, history, image, chatbot_instance=chatbot_instance)
 
         def process_image_search_with_chatbot(image, history):
-            if image is None:
-                return create_empty_outputs()
-            
-            image_npy = np.array(image)
-            response = chatbot_instance.query_image(image_npy)
-            answer_text = response["answer"]
-            
-            image_uris = response.get("image_uris", [])[:5]
-            image_metadatas = response.get("image_metadatas", [])[:5]
-            
-            product_images, captions = process_images(image_uris, image_metadatas)
-            results_df = create_results_dataframe([], image_metadatas)
-            
-            history.append(("Find products similar to this image", answer_text))
-            
-            return prepare_outputs(history, 
-                                [None]*5, [""]*5,
-                                product_images, captions, results_df)
+            return process_image_search(image, history, chatbot_instance=chatbot_instance)
 
         # Update event handlers to use the new functions
         msg.submit(